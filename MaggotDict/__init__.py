@@ -8,10 +8,10 @@ def load_tests (loader, tests, pattern):
     """Laod test protocol
     """
     from unittest import TestSuite
-    from . import pretzel
+    from . import pretzel, tests
 
     suite = TestSuite ()
-    for test in (pretzel,):
+    for test in (pretzel, tests):
         suite.addTests (loader.loadTestsFromModule (test))
 
     return suite
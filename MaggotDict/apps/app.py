@@ -1,15 +1,23 @@
 # -*- coding: utf-8 -*-
 import os
+import json
 import uuid
+import socket
+import itertools
 
+from .daemon import DictClient, DictDaemonError
 from ..xdg import xdg_data_home
-from ..dictionary import Dictionary
+from ..dictionary import Dictionary, DictionaryError, FoldKey
+from ..fold import Fold
+from ..sources import Source
+from ..metrics import Metrics
 
 from ..pretzel.store import FileStore
 from ..pretzel.config import StoreConfig
 from ..pretzel.disposable import CompositeDisposable
+from ..pretzel.log import Log
 
-__all__ = ('DictApp', 'DictAppError',)
+__all__ = ('DictApp', 'DictAppError', 'DictionaryProxy',)
 #------------------------------------------------------------------------------#
 # Dictionary Application                                                       #
 #------------------------------------------------------------------------------#
@@ -24,9 +32,11 @@ class DictApp (object):
     root_path  = os.path.join (xdg_data_home, 'maggot-dict')
     dcts_path  = os.path.join (root_path, 'dicts')
     state_path = os.path.join (root_path, 'state.store')
+    daemon_path = os.path.join (root_path, 'daemon.sock')
 
     dct_suffix  = '.mdict'
     config_name = b'mdict::config'
+    dcts_info_name = b'mdict::dcts_info'
 
     def __init__ (self):
         self.dispose = CompositeDisposable ()
@@ -45,14 +55,21 @@ class DictApp (object):
         })
         self.dispose += self.config
 
+        # dictionaries metadata (by file name)
+        self.dcts_info = StoreConfig (self.state, self.dcts_info_name, lambda: {})
+        self.dispose += self.dcts_info
+
         # history
         self.hist = History (self.state)
 
-        # dictionaries
+        # daemon client
+        self.daemon = DictClient (self.daemon_path)
+
+        # dictionaries (opened only when queried)
         dcts = []
         for name in os.listdir (self.dcts_path):
             if name.endswith (self.dct_suffix):
-                dct = Dictionary (os.path.join (self.dcts_path, name))
+                dct = self.dct_proxy (os.path.join (self.dcts_path, name))
                 self.dispose += dct
 
                 # configuration
@@ -69,6 +86,10 @@ class DictApp (object):
 
         self.dcts = Dicts (dcts)
 
+        # completion
+        self.comp = Completion (self.state)
+        self.CompletionSync ()
+
     #--------------------------------------------------------------------------#
     # Properties                                                               #
     #--------------------------------------------------------------------------#
@@ -84,6 +105,12 @@ class DictApp (object):
         """
         return self.hist
 
+    @property
+    def Completion (self):
+        """Completion index
+        """
+        return self.comp
+
     #--------------------------------------------------------------------------#
     # Execute                                                                  #
     #--------------------------------------------------------------------------#
@@ -121,15 +148,16 @@ class DictApp (object):
             finally:
                 scope.close ()
 
-        scope = self.RenderScope ('card', card, ctx)
-        try:
-            if scope.send (None):
-                render (body)
-            scope.send (None)
+        with Metrics.Span (ctx.get ('name', 'app'), 'render'):
+            scope = self.RenderScope ('card', card, ctx)
+            try:
+                if scope.send (None):
+                    render (body)
+                scope.send (None)
 
-        except StopIteration: pass
-        finally:
-            scope.close ()
+            except StopIteration: pass
+            finally:
+                scope.close ()
 
     def RenderScope (self, name, value, ctx):
         """Render scope
@@ -139,23 +167,46 @@ class DictApp (object):
     #--------------------------------------------------------------------------#
     # Install | Uninstall                                                      #
     #--------------------------------------------------------------------------#
-    def Install (self, path, report = None):
+    def Install (self, path, report = None, jobs = None, block_size = None, text_index = False, link = False,
+                 memory = None, fuzzy_index = True):
         """Install dictionary
+
+        If "link" is true, dictionary is not compiled and cards are read
+        directly from source files (see "Dictionary.Link"). If "fuzzy_index"
+        is false, dictionary is compiled without suggestions. Installed
+        dictionary with the same name is replaced, and unchanged cards are
+        taken from it (see "Dictionary.Compile").
         """
+        # installed dictionary compiled from the same source
+        base_path, source = None, Source (path)
+        if source is not None:
+            with source:
+                base_path = os.path.join (self.dcts_path, '{}{}'.format (source.Name, self.dct_suffix))
+
         try:
             tmp_path = os.path.join (self.dcts_path, '{}.tmp'.format (uuid.uuid4 ()))
-            dct = Dictionary.Compile (path, tmp_path, report)
-            dct_path = os.path.join (self.dcts_path, '{}{}'.format (dct.Name, self.dct_suffix))
+            with (Dictionary.Link (path, tmp_path, report, memory) if link else
+                  Dictionary.Compile (path, tmp_path, report, jobs, block_size, text_index, base_path, memory,
+                      fuzzy_index)) as dct:
+                dct_path = os.path.join (self.dcts_path, '{}{}'.format (dct.Name, self.dct_suffix))
+
+            dct_old = self.dcts.Pop (dct.Name)
+            if dct_old is not None:
+                self.comp.Remove (dct_old)
+                dct_old.Dispose ()
             os.rename (tmp_path, dct_path)
+            dct = self.dct_proxy (dct_path)
 
-            self.config.dcts [dct.Name] = {
-                'weight': 0,
-                'disabled': False
-            }
+            if self.config.dcts.Get (dct.Name, None) is None:
+                self.config.dcts [dct.Name] = {
+                    'weight': 0,
+                    'disabled': False
+                }
             dct.config = self.config.dcts [dct.Name]
 
             self.dcts.Add (dct)
             self.dispose += dct
+            self.CompletionSync ()
 
         finally:
             if os.path.exists (tmp_path):
@@ -169,9 +220,63 @@ class DictApp (object):
             raise DictAppError ('No such dictionary: {}'.format (id))
 
         del self.config.dcts [dct.Name]
+        self.comp.Remove (dct)
+        if self.dcts_info.Get (os.path.basename (dct.File), None) is not None:
+            del self.dcts_info [os.path.basename (dct.File)]
         dct.Dispose ()
         os.unlink (dct.File)
 
+    def CompletionSync (self):
+        """Update completion index to match enabled dictionaries
+        """
+        self.comp.Sync (self.dcts.Enabled (), self.dcts)
+
+    #--------------------------------------------------------------------------#
+    # Private                                                                  #
+    #--------------------------------------------------------------------------#
+    def daemon_request (self, action, **args):
+        """Execute request on daemon
+
+        Returns None if daemon is not running or failed to execute request, in
+        which case caller is expected to execute it in process.
+        """
+        if not self.daemon.IsAvailable:
+            return None
+        try:
+            return self.daemon.Request (action, **args)
+        except socket.error:
+            return None
+        except DictDaemonError as error:
+            Log.Warning ('daemon request failed: {}'.format (error))
+            return None
+
+    def dct_proxy (self, path):
+        """Create dictionary proxy for file
+
+        Metadata is taken from state store if file has not changed since it was
+        cached, otherwise dictionary is opened and its metadata is cached.
+        """
+        name, stat = os.path.basename (path), os.stat (path)
+        info = self.dcts_info.Get (name, None)
+        if (info is not None and info.mtime == stat.st_mtime and info.file_size == stat.st_size and
+                info.Get ('source', None) is not None and info.Get ('text_indexed', None) is not None):
+            return DictionaryProxy (path, info.name, info.language, info.size, info.size_on_store,
+                info.text_indexed, json.loads (info.source))
+
+        dct = Dictionary (path, mapped = True)
+        self.dcts_info [name] = {
+            'mtime'        : stat.st_mtime,
+            'file_size'    : stat.st_size,
+            'name'         : dct.Name,
+            'language'     : dct.Language,
+            'size'         : dct.Size,
+            'size_on_store': dct.SizeOnStore,
+            'text_indexed' : dct.TextIndexed,
+            'source'       : json.dumps (dct.SourceFiles), # linked source files (as text, passed to dictionary as is)
+        }
+        return DictionaryProxy (path, dct.Name, dct.Language, dct.Size, dct.SizeOnStore, dct.TextIndexed,
+            dct.SourceFiles, dct)
+
     #--------------------------------------------------------------------------#
     # Dispose                                                                  #
     #--------------------------------------------------------------------------#
@@ -187,6 +292,90 @@ class DictApp (object):
         self.Dispose ()
         return False
 
+#------------------------------------------------------------------------------#
+# Dictionary Proxy                                                             #
+#------------------------------------------------------------------------------#
+class DictionaryProxy (object):
+    """Lazily opened dictionary
+
+    Provides dictionary metadata without opening it. Dictionary is opened on
+    first access to anything else, which is forwarded to it. Linked dictionary
+    whose source files have changed is not available (see "Available").
+    """
+    def __init__ (self, file, name, language, size, size_on_store, text_indexed = False, source = None, dct = None):
+        self.file = file
+        self.name = name
+        self.language = tuple (language)
+        self.size = size
+        self.size_on_store = tuple (size_on_store)
+        self.text_indexed = text_indexed
+        self.source = source
+        self.available = None
+        self.dct = dct
+        self.config = None
+
+    def Open (self):
+        """Open dictionary (if it has not been opened yet)
+        """
+        if self.dct is None:
+            self.dct = Dictionary (self.file, mapped = True)
+        return self.dct
+
+    @property
+    def Name (self):
+        return self.name
+
+    @property
+    def Language (self):
+        return self.language
+
+    @property
+    def Size (self):
+        return self.size
+
+    @property
+    def SizeOnStore (self):
+        return self.size_on_store
+
+    @property
+    def File (self):
+        return self.file
+
+    @property
+    def TextIndexed (self):
+        return self.text_indexed
+
+    @property
+    def IsOpened (self):
+        return self.dct is not None
+
+    @property
+    def Available (self):
+        """Whether cards can be loaded
+
+        Source files of linked dictionary are checked once (without opening
+        dictionary), warning is shown if they have changed.
+        """
+        if self.available is None:
+            self.available = True
+            if self.source is not None:
+                try:
+                    Dictionary.SourceCheck (self.source)
+                except DictionaryError as error:
+                    Log.Warning ('dictionary \'{}\' is skipped: {}'.format (self.name, error))
+                    self.available = False
+        return self.available
+
+    def __getattr__ (self, attr):
+        if attr.startswith ('__'):
+            raise AttributeError (attr)
+        return getattr (self.Open (), attr)
+
+    def Dispose (self):
+        if self.dct is not None:
+            self.dct.Dispose ()
+            self.dct = None
+
 #------------------------------------------------------------------------------#
 # Dictionaries set                                                             #
 #------------------------------------------------------------------------------#
@@ -231,7 +420,83 @@ class Dicts (object):
         return len (self.by_index)
 
     def Enabled (self):
-        return iter (dct for dct in self.by_index if not dct.config.disabled)
+        return iter (dct for dct in self.by_index if not dct.config.disabled and dct.Available)
+
+#------------------------------------------------------------------------------#
+# Completion                                                                   #
+#------------------------------------------------------------------------------#
+class Completion (object):
+    """Merged and deduplicated completion index of enabled dictionaries
+
+    Maps folded key of the word (see "FoldKey") to the number of indexed
+    dictionaries containing it, so dictionaries can be added and removed
+    without full rebuild, and prefix matches words regardless of case and
+    diacritics.
+    """
+    words_name = b'mdict::comp_fold'
+    dcts_name = b'mdict::comp_fold_dcts'
+
+    def __init__ (self, store):
+        self.store = store
+        self.words = store.Mapping (self.words_name, key_type = 'bytes', value_type = 'struct:>I')
+
+        dcts = store.LoadByName (self.dcts_name)
+        self.dcts = set (json.loads (dcts.decode ('utf-8'))) if dcts else set ()
+
+    def __call__ (self, prefix, count):
+        """Complete utf-8 encoded prefix with at most "count" utf-8 encoded words
+        """
+        prefix = Fold (prefix.decode ('utf-8')).encode ('utf-8')
+        return list (itertools.islice ((key [key.index (b'\0') + 1:] for key in itertools.takewhile (
+            lambda key: key.startswith (prefix), (key for key, _ in self.words [prefix:]))), count))
+
+    def Sync (self, enabled, dcts):
+        """Index exactly "enabled" dictionaries
+
+        Dictionaries which are no longer enabled are looked up by name in
+        "dcts". If one of them is missing, index is rebuilt from scratch.
+        """
+        enabled = dict ((dct.Name, dct) for dct in enabled)
+        removed = self.dcts.difference (enabled)
+        if any (dcts [name] is None for name in removed):
+            for word in [word for word, _ in self.words [b'':]]:
+                self.words.pop (word)
+            self.dcts.clear ()
+        else:
+            for name in removed:
+                self.Remove (dcts [name])
+
+        for name, dct in enabled.items ():
+            self.Add (dct)
+
+    def Add (self, dct):
+        """Add dictionary words
+        """
+        if dct.Name in self.dcts:
+            return
+        for word, _ in dct.word_index.index [b'':]:
+            key = FoldKey (word.decode ('utf-8'))
+            self.words [key] = self.words.get (key, 0) + 1
+        self.dcts.add (dct.Name)
+        self.save ()
+
+    def Remove (self, dct):
+        """Remove dictionary words
+        """
+        if dct.Name not in self.dcts:
+            return
+        for word, _ in dct.word_index.index [b'':]:
+            key = FoldKey (word.decode ('utf-8'))
+            count = self.words.get (key, 0)
+            if count > 1:
+                self.words [key] = count - 1
+            else:
+                self.words.pop (key, None)
+        self.dcts.discard (dct.Name)
+        self.save ()
+
+    def save (self):
+        self.store.SaveByName (self.dcts_name, json.dumps (sorted (self.dcts)).encode ('utf-8'))
 
 #------------------------------------------------------------------------------#
 # History                                                                      #
@@ -247,11 +512,12 @@ class History (object):
         self.by_count = store.Mapping (self.by_count_name, key_type = 'json', value_type = 'struct:b')
 
     def WordAdd (self, word):
-        count = self.by_word.get (word, 0)
-        self.by_word [word] = count + 1
+        with Metrics.Span ('app', 'history'):
+            count = self.by_word.get (word, 0)
+            self.by_word [word] = count + 1
 
-        self.by_count.pop ([-count, word])
-        self.by_count [[-count - 1, word]] = 0
+            self.by_count.pop ([-count, word])
+            self.by_count [[-count - 1, word]] = 0
 
     def WordGet (self, word):
         return self.by_word.get (word, 0)
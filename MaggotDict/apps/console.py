@@ -3,11 +3,14 @@ import io
 import os
 import sys
 import getopt
-import heapq
 import json
+import signal
 import itertools
+from multiprocessing.pool import ThreadPool
 
 from .app import DictApp
+from .daemon import DictDaemon, WordsSuggest
+from ..metrics import Metrics
 from ..pretzel.console import *
 from ..pretzel.log import Log
 
@@ -23,8 +26,12 @@ __all__ = ('ConsoleDictApp',)
 class ConsoleDictApp (DictApp):
     """Console dictionary application
     """
-    comp_default  = 50
-    hist_default  = 30
+    comp_default    = 50
+    suggest_default = 5
+    search_default  = 50
+    batch_size      = 1 << 12
+    lookup_threads  = 4
+    hist_default    = 30
 
     theme_default = {
         'bold'        : Color (COLOR_MAGENTA, COLOR_NONE, ATTR_BOLD | ATTR_FORCE),
@@ -64,6 +71,15 @@ class ConsoleDictApp (DictApp):
     #--------------------------------------------------------------------------#
     # Execute                                                                  #
     #--------------------------------------------------------------------------#
+    def __call__ (self):
+        """Execute application (and explain it if requested)
+        """
+        try:
+            self.Execute ()
+        finally:
+            if Metrics.Enabled ():
+                self.ExplainAction ()
+
     def Execute (self):
         """Execute application
         """
@@ -75,13 +91,38 @@ class ConsoleDictApp (DictApp):
 
         # parse arguments
         try:
-            opts, args = getopt.getopt (sys.argv [1:], "?hSHWIU:D:d")
+            opts, args = getopt.getopt (sys.argv [1:], "?hSHWIU:D:dj:B:M:strbXLF")
 
         except getopt.GetoptError as error:
             Log.Error (str (error))
             self.Usage ()
             return
 
+        # modifiers
+        jobs, block_size, memory = None, None, None
+        text_index = any (opt == '-t' for opt, arg in opts)
+        fuzzy_index = not any (opt == '-F' for opt, arg in opts)
+        link = any (opt == '-L' for opt, arg in opts)
+        if any (opt == '-X' for opt, arg in opts):
+            Metrics.Enable ()
+        for opt, arg in opts:
+            if opt in ('-j', '-B', '-M'):
+                try:
+                    value = int (arg)
+                    if value < 1:
+                        raise ValueError ()
+                except ValueError:
+                    Log.Error ('{} requires positive integer argument: {}'.format (opt, arg))
+                    self.Usage ()
+                    return
+
+                if opt == '-j':
+                    jobs = value
+                elif opt == '-B':
+                    block_size = value << 10
+                else:
+                    memory = value << 20
+
         for opt, arg in opts:
             # Statistics
             if opt == '-S':
@@ -98,7 +139,7 @@ class ConsoleDictApp (DictApp):
                 try:
                     for arg in args:
                         with Log ('installing {}'.format (os.path.basename (arg))) as report:
-                            self.Install (arg, report)
+                            self.Install (arg, report, jobs, block_size, text_index, link, memory, fuzzy_index)
                 except Exception: pass
 
                 return
@@ -133,6 +174,7 @@ class ConsoleDictApp (DictApp):
                     return
 
                 dct.config.disabled = not dct.config.disabled
+                self.CompletionSync ()
                 self.StatAction ()
                 return
 
@@ -179,10 +221,30 @@ class ConsoleDictApp (DictApp):
 
                 else:
                     dcts.extend (self.Dicts)
+                dcts = [dct for dct in dcts if dct.Available]
 
                 self.DumpAction (args [0] if PY3 else args [0].decode ('utf-8'), dcts)
                 return
 
+            # Batch lookup
+            elif opt == '-b':
+                self.BatchAction (sys.stdin if PY2 else io.TextIOWrapper (sys.stdin.buffer, 'utf-8'))
+                return
+
+            # Reverse lookup
+            elif opt == '-r':
+                self.SearchAction (' '.join (args) if PY3 else ' '.join (args).decode ('utf-8'))
+                return
+
+            # Daemon
+            elif opt == '-s':
+                self.DaemonAction ()
+                return
+
+            # Modifiers
+            elif opt in ('-j', '-B', '-M', '-t', '-F', '-X', '-L'):
+                continue
+
             # Help
             elif opt in ('-?', '-h'):
                 self.Usage ()
@@ -204,12 +266,22 @@ class ConsoleDictApp (DictApp):
         sys.stderr.write ('''Usage: {command} [options] <word>
 options:
     -I <files>        : install dictionaries
+    -j <jobs>         : parse with <jobs> processes (used with -I)
+    -B <size>         : pack cards into <size> KiB blocks (used with -I)
+    -M <size>         : sort headwords within <size> MiB (used with -I)
+    -t                : create full-text index (used with -I)
+    -F                : skip fuzzy index, no suggestions (used with -I)
+    -L                : link DICT files instead of compiling (used with -I)
     -U <dct>          : uninstall dictionary      (dct is name or index)
     -D <dct>          : toggle disable dictionary (dct is name or index)
     -W <dct> <weight> : change dictionary weight  (dct is name or index)
     -d <word> [dct]   : dump content of the card  (dct is name or index)
+    -r <words>        : find words with all <words> in translation
+    -b                : look up words from stdin  (writes json lines)
     -H [count]        : show history              (default: {hist_default})
     -S                : show statistics
+    -s                : serve lookups from resident daemon
+    -X                : explain where time of the command went
     -?|h              : show this help message
 '''.format (
     command = os.path.basename (sys.argv [0]),
@@ -227,23 +299,134 @@ options:
             self.Usage ()
             return
 
-        found = False
-        for dct in self.Dicts.Enabled ():
-            if dct.config.disabled:
-                continue
+        dcts = list (self.Dicts.Enabled ())
+        cards = self.daemon_request ('lookup', word = word, files = [dct.File for dct in dcts])
+
+        # dictionaries are looked up concurrently (reading and decompression
+        # release GIL), cards are rendered in order as soon as they are ready,
+        # explained lookups are sequential so spans are not mixed up
+        pool = None
+        if cards is None:
+            if self.lookup_threads > 1 and len (dcts) > 1 and not Metrics.Enabled ():
+                pool = ThreadPool (min (self.lookup_threads, len (dcts)))
+                cards = pool.imap (lambda dct: dct.ByWord [word][1], dcts)
+            else:
+                cards = (dct.ByWord [word][1] for dct in dcts)
 
-            card_word, card = dct.ByWord [word]
-            if card:
-                found = True
-                text = Text ()
-                self.Render (card, name = dct.Name, text = text)
-                self.console.Write (text)
+        found = False
+        try:
+            for dct, card in zip (dcts, cards):
+                if card:
+                    found = True
+                    text = Text ()
+                    self.Render (card, name = dct.Name, text = text)
+                    self.console.Write (text)
+        finally:
+            if pool is not None:
+                pool.terminate ()
 
         if found:
             self.History.WordAdd (word)
+            return
+
+        words = self.daemon_request ('suggest', word = word, files = [dct.File for dct in dcts],
+            count = self.suggest_default)
+        if words is None:
+            words = WordsSuggest (dcts, word, self.suggest_default)
+        if words:
+            Log.Warning ('Word was not found: {} (did you mean: {})'.format (word, ', '.join (words)))
         else:
             Log.Warning ('Word was not found: {}'.format (word))
 
+    def BatchAction (self, stream):
+        """Look up words read from stream (one per line)
+
+        Each word is written as json line {"word": word, "cards": {name: card}}
+        as soon as its batch has been looked up in all enabled dictionaries.
+        """
+        dcts = list (self.Dicts.Enabled ())
+        lines = (line.rstrip ('\r\n') for line in stream)
+        if PY2:
+            lines = (line.decode ('utf-8') for line in lines)
+
+        while True:
+            words = list (itertools.islice (lines, self.batch_size))
+            if not words:
+                break
+
+            results = [dct.ByWord.GetMany (words) for dct in dcts]
+            for index, word in enumerate (words):
+                cards = dict ((dct.Name, self.card_output (result [index][1]))
+                    for dct, result in zip (dcts, results) if result [index][1])
+                sys.stdout.write (json.dumps ({'word': word, 'cards': cards}))
+                sys.stdout.write ('\n')
+            sys.stdout.flush ()
+
+    def SearchAction (self, text):
+        """Show words whose translations contain all words of the text
+        """
+        if not text:
+            Log.Error ('-r requires words argument')
+            self.Usage ()
+            return
+
+        dcts = [dct for dct in self.Dicts.Enabled () if dct.TextIndexed]
+        if not dcts:
+            Log.Warning ('None of dictionaries has full-text index (install with -t)')
+            return
+
+        words = self.daemon_request ('search', text = text, files = [dct.File for dct in dcts],
+            count = self.search_default)
+        if words is None:
+            words = ([word for word, card in dct.Search (text, self.search_default)] for dct in dcts)
+
+        table = [('Word', []), ('Dictionary', [])]
+        for dct, dct_words in zip (dcts, words):
+            for word in dct_words:
+                table [0][1].append (word)
+                table [1][1].append (dct.Name)
+
+        if table [0][1]:
+            self.RenderTable (table)
+        else:
+            Log.Warning ('Nothing was found: {}'.format (text))
+
+    def ExplainAction (self):
+        """Show recorded metrics (on standard error)
+
+        Each scope (dictionary, compilation or application) is shown with
+        total time of its spans and values of its counters. Lookups served by
+        daemon are not recorded.
+        """
+        report = Metrics.Report ()
+        spans = sorted (set (name for scope, scope_spans, counters in report for name in scope_spans))
+        counters = sorted (set (name for scope, scope_spans, scope_counters in report for name in scope_counters))
+
+        table = [('Scope', [])] + [('{} ms'.format (name), []) for name in spans] + [(name, []) for name in counters]
+        for scope, scope_spans, scope_counters in report:
+            table [0][1].append (scope)
+            for column, name in zip (table [1:], spans):
+                column [1].append ('{:.3f}'.format (scope_spans [name][0] * 1e3) if name in scope_spans else '-')
+            for column, name in zip (table [1 + len (spans):], counters):
+                column [1].append (str (scope_counters.get (name, '-')))
+
+        if table [0][1]:
+            self.RenderTable (table, PlainConsole (sys.stderr))
+
+    def DaemonAction (self):
+        """Serve lookups from resident daemon
+
+        Application state is released before serving, so daemon does not hold
+        (and later overwrite) configuration and history updated by clients.
+        """
+        self.Dispose ()
+        signal.signal (signal.SIGTERM, lambda signo, frame: sys.exit (0))
+        with DictDaemon (self.daemon_path) as daemon:
+            Log.Warning ('serving lookups on {}'.format (self.daemon_path))
+            try:
+                daemon.Serve ()
+            except KeyboardInterrupt: pass
+
     def StatAction (self):
         """Show statistics
         """
@@ -281,37 +464,42 @@ options:
         """
         name, sep, complete = comp_line [:comp_point].partition (' ')
         complete = complete.encode ('utf-8')
-        complete_size = complete.rfind (b' ') + 1
+        complete_spaces = complete.count (b' ')
 
-        words = list (
-            itertools.islice (
-                itertools.takewhile (lambda word: word.startswith (complete), (word for word, _ in
-                    heapq.merge (*(dct.word_index.index [complete:] for dct in self.Dicts.Enabled ())))),
-                self.comp_default))
+        # words match folded prefix, so their leading words (already completed
+        # by shell) are skipped by spaces rather than by prefix size
+        words = self.Completion (complete, self.comp_default)
 
         if words:
             for word in words:
-                print (word [complete_size:].decode ('utf-8'))
+                print (word.split (b' ', complete_spaces) [-1].decode ('utf-8'))
 
     def DumpAction (self, word, dcts):
         """Dump content of the card
         """
-        if len (dcts) > 1:
-            cards = {}
-            for dct in dcts:
-                card_word, card = dct.ByWord [word]
-                if card:
-                    cards [dct.Name] = card
+        cards = self.daemon_request ('lookup', word = word, files = [dct.File for dct in dcts])
+        if cards is None:
+            cards = [dct.ByWord [word][1] for dct in dcts]
 
+        if len (dcts) > 1:
+            cards = dict ((dct.Name, self.card_output (card)) for dct, card in zip (dcts, cards) if card)
             sys.stdout.write (json.dumps (cards, indent = 2))
             sys.stdout.write ('\n')
 
-        else:
-            card_word, card = dcts [0].ByWord [word]
+        elif cards:
+            card = cards [0]
             if card:
-                sys.stdout.write (json.dumps (card, indent = 2))
+                sys.stdout.write (json.dumps (self.card_output (card), indent = 2))
                 sys.stdout.write ('\n')
 
+    def card_output (self, card):
+        """Card as it is written by dump and batch lookups
+
+        Numbers of card words are internal to dictionary (and not stored by
+        all of its layouts), so they are left out.
+        """
+        return dict ((key, value) for key, value in card.items () if key != 'numbers')
+
     #--------------------------------------------------------------------------#
     # Render                                                                   #
     #--------------------------------------------------------------------------#
@@ -360,8 +548,8 @@ options:
 
         yield True
 
-    def RenderTable (self, table):
-        """Render table
+    def RenderTable (self, table, console = None):
+        """Render table (on console of application by default)
         """
         if not table:
             return
@@ -393,7 +581,7 @@ options:
                 text.Write (' ')
             text.Write ('\n')
 
-        self.console.Write (text)
+        (console or self.console).Write (text)
 
 #------------------------------------------------------------------------------#
 # Plain Console                                                                #
@@ -401,10 +589,12 @@ options:
 class PlainConsole (object):
     """Minimal plain console for non tty output
     """
+    def __init__ (self, stream = None):
+        self.stream = stream or sys.stdout
 
     def Write (self, text):
-        sys.stdout.write (text.Encode ().decode ('utf-8'))
-        sys.stdout.flush ()
+        self.stream.write (text.Encode ().decode ('utf-8'))
+        self.stream.flush ()
 
     def Size (self):
         return 0, 0
@@ -0,0 +1,198 @@
+# -*- coding: utf-8 -*-
+import os
+import json
+import socket
+
+from ..dictionary import Dictionary
+
+__all__ = ('DictDaemon', 'DictClient', 'DictDaemonError', 'WordsSuggest',)
+#------------------------------------------------------------------------------#
+# Protocol                                                                     #
+#------------------------------------------------------------------------------#
+# Each connection carries exactly one request and one response, both are json
+# objects. Request is {"action": name, ...arguments}, response is either
+# {"result": value} or {"error": message}. Client closes its writing side after
+# the request and daemon closes connection after the response.
+#------------------------------------------------------------------------------#
+class DictDaemonError (Exception):
+    """Dictionary daemon error
+    """
+    pass
+
+def WordsSuggest (dcts, word, count):
+    """Headwords of dictionaries nearest to the word
+
+    Returns at most "count" words ordered by edit distance.
+    """
+    distances = {}
+    for dct in dcts:
+        for distance, candidate in dct.Suggest (word, count):
+            distances [candidate] = min (distance, distances.get (candidate, distance))
+    return [candidate for distance, candidate in sorted ((distance, candidate)
+        for candidate, distance in distances.items ()) [:count]]
+
+#------------------------------------------------------------------------------#
+# Daemon                                                                       #
+#------------------------------------------------------------------------------#
+class DictDaemon (object):
+    """Resident lookup daemon
+
+    Keeps dictionaries open (with their caches warmed) and serves lookups over
+    unix socket. Configuration and history are left to the client, which sends
+    files of dictionaries to query with each request, so daemon never writes
+    application state.
+    """
+    timeout = 10
+
+    def __init__ (self, path):
+        self.path = path
+        self.dcts = {} # file -> (mtime, dictionary)
+
+        if os.path.exists (path):
+            os.unlink (path)
+        self.sock = socket.socket (socket.AF_UNIX, socket.SOCK_STREAM)
+        self.sock.bind (path)
+        self.sock.listen (16)
+
+        self.actions = {
+            'lookup'  : self.lookup_action,
+            'suggest' : self.suggest_action,
+            'search'  : self.search_action,
+        }
+
+    #--------------------------------------------------------------------------#
+    # Serve                                                                    #
+    #--------------------------------------------------------------------------#
+    def Serve (self):
+        """Serve requests until disposed or interrupted
+        """
+        while self.sock is not None:
+            conn, addr = self.sock.accept ()
+            try:
+                conn.settimeout (self.timeout)
+                try:
+                    request = json.loads (recv_all (conn).decode ('utf-8'))
+                    action = self.actions.get (request.pop ('action', None))
+                    if action is None:
+                        raise DictDaemonError ('Unknown action')
+                    response = {'result': action (**request)}
+                except Exception as error:
+                    response = {'error': '{}: {}'.format (type (error).__name__, error)}
+                conn.sendall (json.dumps (response).encode ('utf-8'))
+            except socket.error: pass
+            finally:
+                conn.close ()
+
+    #--------------------------------------------------------------------------#
+    # Actions                                                                  #
+    #--------------------------------------------------------------------------#
+    def lookup_action (self, word, files):
+        """Cards of the word (or None) for each of the dictionaries
+        """
+        return [dct.ByWord [word][1] for dct in self.dcts_get (files)]
+
+    def suggest_action (self, word, files, count):
+        """Headwords nearest to the word
+        """
+        return WordsSuggest (self.dcts_get (files), word, count)
+
+    def search_action (self, text, files, count):
+        """Words whose translations contain all words of the text
+        """
+        return [[word for word, card in dct.Search (text, count)] for dct in self.dcts_get (files)]
+
+    #--------------------------------------------------------------------------#
+    # Private                                                                  #
+    #--------------------------------------------------------------------------#
+    def dcts_get (self, files):
+        """Get dictionaries by files (reopens changed dictionaries)
+        """
+        dcts = []
+        for file in files:
+            mtime = os.stat (file).st_mtime
+            mtime_dct = self.dcts.get (file)
+            if mtime_dct is None or mtime_dct [0] != mtime:
+                if mtime_dct is not None:
+                    mtime_dct [1].Dispose ()
+                mtime_dct = mtime, Dictionary (file, mapped = True)
+                self.dcts [file] = mtime_dct
+            dcts.append (mtime_dct [1])
+
+        # close removed dictionaries
+        for file in [file for file in self.dcts if not os.path.exists (file)]:
+            self.dcts.pop (file) [1].Dispose ()
+
+        return dcts
+
+    #--------------------------------------------------------------------------#
+    # Dispose                                                                  #
+    #--------------------------------------------------------------------------#
+    def Dispose (self):
+        """Dispose daemon
+        """
+        if self.sock is not None:
+            self.sock.close ()
+            self.sock = None
+            if os.path.exists (self.path):
+                os.unlink (self.path)
+
+        for mtime, dct in self.dcts.values ():
+            dct.Dispose ()
+        self.dcts.clear ()
+
+    def __enter__ (self):
+        return self
+
+    def __exit__ (self, et, eo, tb):
+        self.Dispose ()
+        return False
+
+#------------------------------------------------------------------------------#
+# Client                                                                       #
+#------------------------------------------------------------------------------#
+class DictClient (object):
+    """Dictionary daemon client
+    """
+    timeout = 10
+
+    def __init__ (self, path):
+        self.path = path
+
+    @property
+    def IsAvailable (self):
+        """Whether daemon socket exists
+        """
+        return os.path.exists (self.path)
+
+    def Request (self, action, **args):
+        """Execute request
+
+        Raises socket.error if daemon is not running and DictDaemonError if
+        daemon failed to execute request.
+        """
+        args ['action'] = action
+        sock = socket.socket (socket.AF_UNIX, socket.SOCK_STREAM)
+        try:
+            sock.settimeout (self.timeout)
+            sock.connect (self.path)
+            sock.sendall (json.dumps (args).encode ('utf-8'))
+            sock.shutdown (socket.SHUT_WR)
+            response = json.loads (recv_all (sock).decode ('utf-8'))
+        finally:
+            sock.close ()
+
+        if 'error' in response:
+            raise DictDaemonError (response ['error'])
+        return response ['result']
+
+def recv_all (sock):
+    """Receive data until the other side closes connection
+    """
+    chunks = []
+    while True:
+        chunk = sock.recv (1 << 16)
+        if not chunk:
+            return b''.join (chunks)
+        chunks.append (chunk)
+
+# vim: nu ft=python columns=120 :
@@ -0,0 +1,93 @@
+# -*- coding: utf-8 -*-
+import collections
+
+__all__ = ('Cache',)
+#------------------------------------------------------------------------------#
+# Cache                                                                        #
+#------------------------------------------------------------------------------#
+class Cache (object):
+    """Least recently used cache bounded by total size of its values
+
+    Size of each value is provided by the caller, so capacity can be measured
+    in bytes rather than in number of entries.
+    """
+    def __init__ (self, capacity):
+        self.capacity = capacity
+        self.size = 0
+        self.hits = 0
+        self.misses = 0
+        self.entries = collections.OrderedDict ()
+
+    #--------------------------------------------------------------------------#
+    # Access                                                                   #
+    #--------------------------------------------------------------------------#
+    def Get (self, key, default = None):
+        """Get value by key and mark it as recently used
+        """
+        entry = self.entries.pop (key, None)
+        if entry is None:
+            self.misses += 1
+            return default
+
+        self.entries [key] = entry
+        self.hits += 1
+        return entry [0]
+
+    def Set (self, key, value, size):
+        """Set value of specified size
+
+        Least recently used values are evicted until cache fits its capacity,
+        values larger then capacity are not cached. Returns value.
+        """
+        entry = self.entries.pop (key, None)
+        if entry is not None:
+            self.size -= entry [1]
+
+        if size > self.capacity:
+            return value
+
+        self.entries [key] = value, size
+        self.size += size
+        while self.size > self.capacity:
+            key, (value_evicted, size_evicted) = self.entries.popitem (last = False)
+            self.size -= size_evicted
+
+        return value
+
+    def Clear (self):
+        """Remove all values
+        """
+        self.entries.clear ()
+        self.size = 0
+
+    #--------------------------------------------------------------------------#
+    # Properties                                                               #
+    #--------------------------------------------------------------------------#
+    @property
+    def Capacity (self):
+        """Maximum total size of cached values
+        """
+        return self.capacity
+
+    @property
+    def Size (self):
+        """Total size of cached values
+        """
+        return self.size
+
+    @property
+    def Hits (self):
+        """Number of successful lookups
+        """
+        return self.hits
+
+    @property
+    def Misses (self):
+        """Number of failed lookups
+        """
+        return self.misses
+
+    def __len__ (self):
+        return len (self.entries)
+
+# vim: nu ft=python columns=120 :
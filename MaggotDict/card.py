@@ -0,0 +1,268 @@
+# -*- coding: utf-8 -*-
+import sys
+import zlib
+import heapq
+import array
+import codecs
+import struct
+
+__all__ = ('CardEncode', 'CardDecode', 'CardBlockEncode', 'CardBlockDecode',
+           'CardCompress', 'CardDecompress', 'CardDictTrain', 'CardError',)
+#------------------------------------------------------------------------------#
+# Card Binary Format                                                           #
+#------------------------------------------------------------------------------#
+# Card is encoded as a header followed by an array of unsigned integers and an
+# utf-8 encoded string table.
+#
+#   header  : version (u8), integer width (u8), integers count (u32 le)
+#   integers: strings count, length (in characters) of each string,
+#             words count, string index of each word,
+#             numbers count, delta of each number,
+#             body node (pre-order)
+#   strings : concatenation of all (deduplicated) strings of the card
+#
+# Node is encoded as "tag << 3 | flags", followed by value if flags has VALUE,
+# and by children count and children if flags has CHILDREN. Tag is an index in
+# the names table of the format version, tags beyond the table refer to the
+# strings of the card (names unknown to the table).
+#------------------------------------------------------------------------------#
+class CardError (Exception):
+    """Card encoding error
+    """
+    pass
+
+card_version = 1
+card_names = (
+    'root', 'text', 'indent', 'fold', 'bold', 'color', 'comment', 'example', 'italic', 'type', 'link',
+    'underline', 'sound', 'transcript', 'translation', 'stress', 'lang', '!trs', 'sub', 'sup', 'url',
+)
+card_names_index = dict ((name, tag) for tag, name in enumerate (card_names))
+card_header = struct.Struct ('<BBI')
+
+node_children = 0x1 # node has children
+node_value    = 0x2 # node has value
+node_integer  = 0x4 # value is an integer (otherwise string index)
+
+# type codes by width
+card_types = dict ((array.array (type).itemsize, type) for type in 'LIHB')
+card_swap = sys.byteorder != 'little'
+card_bytes = array.array.tobytes if sys.version_info [0] > 2 else array.array.tostring
+card_frombytes = array.array.frombytes if sys.version_info [0] > 2 else array.array.fromstring
+card_text = codecs.getdecoder ('utf-8')
+
+def CardEncode (card):
+    """Encode card
+    """
+    strings, strings_index, ints = [], {}, []
+    def string (value):
+        index = strings_index.get (value)
+        if index is None:
+            index = len (strings)
+            strings_index [value] = index
+            strings.append (value)
+        return index
+
+    def node_encode (node):
+        name = node ['name']
+        tag = card_names_index.get (name)
+        if tag is None:
+            tag = len (card_names) + string (name)
+
+        flags, value, children = 0, node.get ('value'), node.get ('children')
+        if 'value' in node:
+            if isinstance (value, int):
+                if value < 0:
+                    raise CardError ('Negative node value: {}'.format (value))
+                flags |= node_value | node_integer
+            else:
+                flags |= node_value
+                value = string (value)
+        if children is not None:
+            flags |= node_children
+
+        ints.append (tag << 3 | flags)
+        if flags & node_value:
+            ints.append (value)
+        if children is not None:
+            ints.append (len (children))
+            for child in children:
+                node_encode (child)
+
+    # words
+    words = card ['words']
+    ints.append (len (words))
+    ints.extend (string (word) for word in words)
+
+    # numbers
+    numbers, number_prev = card.get ('numbers', ()), 0
+    ints.append (len (numbers))
+    for number in numbers:
+        ints.append (number - number_prev)
+        number_prev = number
+
+    # body
+    node_encode (card ['body'])
+
+    # integers
+    ints [:0] = [len (strings)] + [len (string) for string in strings]
+    ints_max = max (ints)
+    for width in (1, 2, 4):
+        if ints_max < 1 << (width << 3):
+            break
+    else:
+        raise CardError ('Card integer is out of range: {}'.format (ints_max))
+    ints = array.array (card_types [width], ints)
+    if card_swap:
+        ints.byteswap ()
+
+    return b''.join ((card_header.pack (card_version, width, len (ints)), card_bytes (ints),
+        ''.join (strings).encode ('utf-8')))
+
+def CardDecode (data):
+    """Decode card
+
+    Data can be any object supporting buffer interface (memory views are
+    decoded without copying).
+    """
+    version, width, ints_count = card_header.unpack_from (data)
+    if version != card_version:
+        raise CardError ('Unsupported card version: {}'.format (version))
+
+    strings_offset = card_header.size + width * ints_count
+    ints = array.array (card_types [width])
+    card_frombytes (ints, data [card_header.size:strings_offset])
+    if card_swap:
+        ints.byteswap ()
+    ints = iter (ints)
+    next_int = getattr (ints, '__next__', None) or ints.next
+
+    # strings
+    text, strings, offset = card_text (data [strings_offset:]) [0], [], 0
+    for _ in range (next_int ()):
+        end = offset + next_int ()
+        strings.append (text [offset:end])
+        offset = end
+    tags = card_names + tuple (strings)
+
+    def node_decode ():
+        code = next_int ()
+        node = {'name': tags [code >> 3]}
+        if code & node_value:
+            value = next_int ()
+            node ['value'] = value if code & node_integer else strings [value]
+        if code & node_children:
+            node ['children'] = [node_decode () for _ in range (next_int ())]
+        return node
+
+    # words
+    words = [strings [next_int ()] for _ in range (next_int ())]
+
+    # numbers
+    numbers, number = [], 0
+    for _ in range (next_int ()):
+        number += next_int ()
+        numbers.append (number)
+
+    return {
+        'words'  : words,
+        'numbers': numbers,
+        'body'   : node_decode (),
+    }
+
+#------------------------------------------------------------------------------#
+# Card Block                                                                   #
+#------------------------------------------------------------------------------#
+# Block is a number of encoded cards (u32 le), end offset of each card relative
+# to the beginning of cards data (u32 le), followed by cards data.
+#------------------------------------------------------------------------------#
+def CardBlockEncode (cards):
+    """Encode block of encoded cards
+    """
+    ends, end = [], 0
+    for card in cards:
+        end += len (card)
+        ends.append (end)
+    return b''.join ([struct.pack ('<{}I'.format (len (cards) + 1), len (cards), *ends)] + list (cards))
+
+def CardBlockDecode (data):
+    """Decode block into list of encoded cards
+    """
+    count = struct.unpack_from ('<I', data) [0]
+    offset = (count + 1) << 2
+    cards, start = [], offset
+    for end in struct.unpack_from ('<{}I'.format (count), data, 4):
+        end += offset
+        cards.append (data [start:end])
+        start = end
+    return cards
+
+#------------------------------------------------------------------------------#
+# Compression                                                                  #
+#------------------------------------------------------------------------------#
+# Cards are small, so compressing each of them with an empty window gives poor
+# ratio. Instead cards can be compressed with raw deflate and a preset dictionary
+# (zdict) trained on sampled cards of the same dictionary.
+#------------------------------------------------------------------------------#
+card_zdict = sys.version_info [:2] >= (3, 3) # zlib supports preset dictionaries
+
+def CardCompress (data, zdict = None):
+    """Compress encoded card (with preset dictionary if provided)
+    """
+    if zdict is None:
+        return zlib.compress (data)
+    compressor = zlib.compressobj (-1, zlib.DEFLATED, -zlib.MAX_WBITS, 8, zlib.Z_DEFAULT_STRATEGY, zdict)
+    return compressor.compress (data) + compressor.flush ()
+
+def CardDecompress (data, zdict = None):
+    """Decompress encoded card (with preset dictionary if provided)
+    """
+    if zdict is None:
+        return zlib.decompress (data)
+    return zlib.decompressobj (-zlib.MAX_WBITS, zdict).decompress (data)
+
+def CardDictTrain (samples, size = 1 << 15, kgram_size = 6, segment_size = 32):
+    """Train preset dictionary on sampled encoded cards
+
+    Segments of samples are scored by document frequency of their k-grams and
+    picked greedily (k-grams of picked segments no longer contribute to scores)
+    until dictionary is full. The most valuable segments are placed at the end
+    of dictionary, as closer matches are cheaper to encode.
+    """
+    # document frequency of k-grams
+    counts = {}
+    for sample in samples:
+        for kgram in set (sample [i:i + kgram_size] for i in range (len (sample) - kgram_size + 1)):
+            counts [kgram] = counts.get (kgram, 0) + 1
+
+    def segment_score (segment):
+        return sum (counts.get (segment [i:i + kgram_size], 0) for i in range (len (segment) - kgram_size + 1))
+
+    # candidate segments (only segments repeated among samples are useful)
+    segments = []
+    for sample in samples:
+        for start in range (0, max (len (sample) - segment_size, 0) + 1, segment_size >> 1):
+            segment = sample [start:start + segment_size]
+            score = segment_score (segment)
+            if score > len (segment):
+                segments.append ((-score, segment))
+    heapq.heapify (segments)
+
+    # greedy selection (scores are updated lazily)
+    zdict, zdict_size = [], 0
+    while segments and zdict_size < size:
+        score, segment = heapq.heappop (segments)
+        score_new = segment_score (segment)
+        if score_new != -score:
+            if score_new > len (segment):
+                heapq.heappush (segments, (-score_new, segment))
+            continue
+
+        for i in range (len (segment) - kgram_size + 1):
+            counts.pop (segment [i:i + kgram_size], None)
+        zdict.append (segment)
+        zdict_size += len (segment)
+
+    zdict.reverse ()
+    return b''.join (zdict) [-size:]
+
+# vim: nu ft=python columns=120 :
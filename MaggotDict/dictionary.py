@@ -2,14 +2,36 @@
 import io
 import os
 import json
+import mmap
 import zlib
+import array
+import bisect
+import random
+import hashlib
+import struct
 import itertools
+import tempfile
 
-from .sources import Source
+from .card import (CardEncode, CardDecode, CardCompress, CardDecompress, CardDictTrain,
+                   CardBlockEncode, CardBlockDecode, card_zdict)
+from .cache import Cache
+from .metrics import Metrics
+from .sort import ExternalSort
+from .fuzzy import FuzzyVariants, FuzzyDistance
+from .fold import Fold
+from .text import TextTokens, CardTokens, PostingsEncode, PostingsDecode
+from .sources import Source, DICTSource
 from .pretzel.store import FileStore
+from .pretzel.disposable import CompositeDisposable
 from .pretzel.store.store.alloc import StoreBlock
 
-__all__ = ('Dictionary', 'DictionaryError',)
+__all__ = ('Dictionary', 'DictionaryError', 'FoldKey',)
+
+try:
+    offset_type = array.array ('Q').typecode
+except ValueError: # python 2 has no 'Q' typecode
+    offset_type = 'L'
+
 #------------------------------------------------------------------------------#
 # Dictionary                                                                   #
 #------------------------------------------------------------------------------#
@@ -21,22 +43,69 @@ class Dictionary (object):
     info_name  = b'mdict::info'
     word_index_name = b'mdict::word_index'
     number_index_name = b'mdict::number_index'
+    zdict_name = b'mdict::zdict'
+    fuzzy_index_name = b'mdict::fuzzy_index'
+    text_index_name = b'mdict::text_index'
+    fingerprint_index_name = b'mdict::fingerprint_index'
+    fuzzy_distance = 2
+    fuzzy_prefix = 7
+    zdict_samples = 2048
+    block_slots_max = (1 << 16) - 1
+    cache_size_default = 1 << 22
+    block_cache_size_default = 1 << 22
+    page_cache_size_default = 1 << 24
+    source_sample_size = 1 << 12
+    source_samples = 256
+    store_probe_prefix = b'mdict::probe::'
+    store_origin_max = 1 << 12 # maximum size of store header (it precedes stored data)
+
+    card_format = 'binary'
+    card_decoders = {
+        'json'  : lambda data: json.loads (data.decode ('utf-8')),
+        'binary': CardDecode,
+    }
+
+    def __init__ (self, filename, cache_size = None, block_cache_size = None, mapped = False):
+        """Open dictionary
 
-    def __init__ (self, filename):
+        Decoded cards are kept in cache bounded by "cache_size" bytes of
+        decompressed card data, zero disables cache. Decompressed blocks (if
+        dictionary has block layout) are kept in cache bounded by
+        "block_cache_size" bytes. If "mapped" is true, file is memory mapped
+        and cards are decompressed directly from the mapping.
+        """
         self.file  = filename
         self.store = FileStore (filename, mode = 'r', offset = len (self.magic))
+        self.cache = Cache (self.cache_size_default if cache_size is None else cache_size)
 
         # check magic
         if self.magic != self.store.LoadByOffset (0, len (self.magic)):
             raise ValueError ('Invalid file magic: {}'.format (filename))
 
-        # indexes
-        self.word_index = DictionaryIndex (self, self.store.Mapping (self.word_index_name),
-             lambda key: key.encode ('utf-8') if key else key)
-        self.number_index = DictionaryIndex (self, self.store.Mapping (self.number_index_name))
-
         # info
         info = json.loads (self.store.LoadByName (self.info_name).decode ('utf-8'))
+
+        # origin of stored data in the file (files without probe are not mapped)
+        self.store_origin = self.store_origin_find (info ['store_probe']) if 'store_probe' in info else None
+
+        # indexes (files without index tree keep word index in stored mapping and
+        # have neither folded index nor word index numbers, so they are looked up
+        # by exact word only and load cards to find number of the word)
+        self.pages, self.pages_inner = Cache (self.page_cache_size_default), {}
+        self.word_index = DictionaryIndex (self,
+             self.tree_open (info ['word_index_tree']) if 'word_index_tree' in info else
+                 self.store.Mapping (self.word_index_name),
+             lambda key: key if key is None else key.encode ('utf-8'),
+             self.tree_open (info ['fold_index_tree']) if 'fold_index_tree' in info else None,
+             info.get ('word_index_numbers'))
+        if 'number_array' in info:
+            desc, entry_format = info ['number_array']
+            number_index = DictionaryArray (lambda offset, size: self.blob_read (desc, offset, size),
+                StoreBlock.FromDesc (desc).used, entry_format)
+        else:
+            number_index = self.store.Mapping (self.number_index_name)
+        self.number_index = DictionaryIndex (self, number_index, numbers = 'key')
+
         self.name = info ['name']
         self.size = info ['size']
         self.language = info ['language']
@@ -44,22 +113,95 @@ class Dictionary (object):
         self.number_index_size = info ['number_index_size']
         self.word_index_size = info ['word_index_size']
 
+        # fuzzy index (files without it have no suggestions)
+        self.fuzzy_distance = info.get ('fuzzy_distance')
+        self.fuzzy_prefix = info.get ('fuzzy_prefix')
+        self.fuzzy_index = None if self.fuzzy_distance is None else self.store.Mapping (self.fuzzy_index_name)
+
+        # full-text index (optional)
+        self.text_index = self.store.Mapping (self.text_index_name) if 'text_index_size' in info else None
+
+        # source fingerprints (files without them can not be incrementally recompiled)
+        self.fingerprint_version = info.get ('fingerprint_version')
+        self.fingerprint_index = None if self.fingerprint_version is None else \
+            self.store.Mapping (self.fingerprint_index_name)
+
+        # card format (files without format contain json cards)
+        self.card_format = info.get ('card_format', 'json')
+        self.card_decode = self.card_decoders.get (self.card_format)
+        if self.card_decode is None:
+            raise DictionaryError ('Unsupported card format \'{}\': {}'.format (self.card_format, filename))
+
+        # cards store numbers of their words (files without it do)
+        self.card_numbers = info.get ('card_numbers', True)
+
+        # card compression (files without compression use plain zlib)
+        self.card_compression = info.get ('card_compression', 'zlib')
+        if self.card_compression == 'zlib':
+            self.zdict = None
+        elif self.card_compression == 'zdict' and card_zdict:
+            self.zdict = self.store.LoadByName (self.zdict_name)
+        else:
+            raise DictionaryError ('Unsupported card compression \'{}\': {}'.format (self.card_compression, filename))
+
+        # layout (files without layout store each card in its own block)
+        # (linked source is opened on first card load, so indexes are accessible
+        # even if source has changed)
+        self.layout = info.get ('layout', 'card')
+        self.blocks, self.source, self.source_files = None, None, None
+        if self.layout == 'card':
+            pass
+        elif self.layout == 'block':
+            self.blocks = Cache (self.block_cache_size_default if block_cache_size is None else block_cache_size)
+        elif self.layout == 'source':
+            self.source_files = info ['source']
+        else:
+            raise DictionaryError ('Unsupported layout \'{}\': {}'.format (self.layout, filename))
+
+        # mapping
+        self.mmap, self.view = None, None
+        if mapped and self.source_files is None and self.store_origin is not None:
+            self.map ()
+
     #--------------------------------------------------------------------------#
     # Factory                                                                  #
     #--------------------------------------------------------------------------#
     @classmethod
-    def Compile (cls, src, dst, report = None):
+    def Compile (cls, src, dst, report = None, jobs = None, block_size = None, text_index = False, base = None,
+                 memory = None, fuzzy_index = True):
         """Create dictionary from file
+
+        "jobs" is the number of processes used to parse source (if source
+        supports parallel parsing). If "block_size" is specified, cards are
+        packed in headword order into compressed blocks of about "block_size"
+        bytes of encoded cards, which makes range iteration and lookups of
+        neighbouring words cheaper. If "text_index" is true, full-text index
+        of card translations is created (see "Search"). If "fuzzy_index" is
+        false, fuzzy index of headwords is not created and dictionary has no
+        suggestions (see "Suggest"). Fuzzy index holds every variant of each
+        headword prefix with up to "fuzzy_distance" deleted characters (up to
+        29 variants per headword), it roughly doubles compile time and output
+        size, so it is worth skipping for large dictionaries.
+
+        "base" is a file name of dictionary compiled earlier from (previous
+        version of) the same source. Cards of source entries which have not
+        changed since are taken from it instead of being parsed, their encoded
+        data is reused without decoding, and compressed data is copied as is
+        (card layout only). Cards do not store numbers of their words, so
+        inserted or removed entries do not change data of other cards.
+        Dictionary is recorded with fingerprints of source entries (if source
+        provides them) for later recompilation.
+
+        "memory" is approximate budget in bytes for sorting of headwords and
+        grouping of their fuzzy variants and full-text postings, which
+        otherwise are kept in memory. Runs exceeding budget are spilled to
+        temporary files and merged. The rest of compile state is kept in
+        arrays of a few bytes per card or headword. Peak memory of the process
+        is recorded as "peak_rss" compile metric.
         """
-        if report:
-            report_value = [0]
-            def report_changed (value):
-                value = round (value, 3)
-                if report_value [0] != value:
-                    report_value [0] = value
-                    report (value)
-        else:
-            report_changed = lambda _: None
+        report_changed = dictionary_report (report)
+        if array.array (offset_type).itemsize < 8:
+            raise DictionaryError ('64-bit unsigned array is not supported on this platform')
 
         with open (src, 'rb') as src_stream:
             if src_stream.read (len (cls.magic)) == cls.magic:
@@ -81,66 +223,441 @@ class Dictionary (object):
         if source is None:
             raise DictionaryError ('Unsupported dictionary format \'{}\''.format (os.path.basename (src)))
 
-        with FileStore (dst, mode = 'n', offset = len (cls.magic)) as store:
+        with FileStore (dst, mode = 'n', offset = len (cls.magic)) as store, CompositeDisposable () as dispose:
             store.SaveByOffset (0, cls.magic)
-            card_save = lambda card, desc: store.Save (zlib.compress (json.dumps (card).encode ('utf-8')), desc)
-            card_load = lambda desc: json.loads (zlib.decompress (store.Load (desc)).decode ('utf-8'))
-
-            # numerate cards
-            words, cards = [], []
-            for card in source.Cards (lambda value: report_changed (value / 2.)):
-                card ['words'].sort ()
-                card_desc = card_save (card, None)
-                card_info = card_desc, []
-                cards.append (card_info)
-                for word in card ['words']:
-                    words.append ((word, card_info))
-            words.sort ()
-
-            number_next = itertools.count ()
-            for word, card_info in words:
-                card_info [1].append (next (number_next))
-
-            # create indexes
-            word_index = store.Mapping (cls.word_index_name, key_type = 'bytes', value_type = 'struct:>QH')
-            number_index = store.Mapping (cls.number_index_name, key_type = 'struct:>I', value_type = 'struct:>QH')
-
-            cards_count, cards_total = 0, len (cards)
-            data_size = 0
-            for card_desc, numbers in cards:
-                numbers.sort ()
-                card = card_load (card_desc)
-                card ['numbers'] = numbers
-                card_desc = card_save (card, card_desc)
-                data_size += StoreBlock.FromDesc (card_desc).size
-
-                # word index
-                for index, word in enumerate (card ['words']):
-                    word_index [word.encode ('utf-8')] = (card_desc, index)
-
-                # number index
-                for index, number in enumerate (numbers):
-                    number_index [number] = (card_desc, index)
-
-                # report
-                cards_count += 1
-                report_changed (.5 + cards_count / cards_total)
+            probe_desc = cls.store_probe (store)
+
+            fingerprinted = getattr (source, 'Fingerprinted', None)
+            base = cls.compile_base (base, source) if fingerprinted else None
+            if base is not None:
+                dispose += base
+
+            phase = Metrics.Phases ('compile')
+
+            # spill cards and collect words (cards are kept in temporary file until
+            # their numbers are known, so each card is compressed and saved only once,
+            # cards taken from base are decoded once for their words and not spilled)
+            words, cards_offset, cards_words = ExternalSort (memory), array.array (offset_type, [0]), array.array ('I')
+            samples, samples_random = [], random.Random (0)
+            cards_fingerprint = bytearray () if fingerprinted else None # fixed size fingerprints by card_id
+            cards_base, cards_base_slot = array.array (offset_type), array.array ('H') # base entry by card_id (or zero)
+            with tempfile.TemporaryFile () as spill, tempfile.TemporaryFile () as index_entries:
+                phase ('parse')
+                if fingerprinted:
+                    cards = fingerprinted (lambda value: report_changed (value / 2.), jobs,
+                        base and (lambda fingerprint: base.fingerprint_index.get (fingerprint) is not None))
+                else:
+                    cards = ((None, card) for card in source.Cards (lambda value: report_changed (value / 2.), jobs))
+
+                for fingerprint, card in cards:
+                    card_id = len (cards_offset) - 1
+                    if card is None:
+                        base_entry = base.fingerprint_index [fingerprint]
+                        base_entry = (base_entry,) if base.layout == 'card' else tuple (base_entry)
+                        card = base.card_load (*base_entry)
+                        cards_base.append (base_entry [0])
+                        cards_base_slot.append (base_entry [-1] if len (base_entry) > 1 else 0)
+                        Metrics.Count ('compile', 'cards_reused')
+                    else:
+                        card ['words'].sort ()
+                        spill.write (json.dumps (card).encode ('utf-8'))
+                        cards_base.append (0)
+                        cards_base_slot.append (0)
+                    cards_offset.append (spill.tell ())
+                    if cards_fingerprint is not None:
+                        cards_fingerprint.extend (fingerprint)
+
+                    cards_words.append (len (card ['words']))
+                    for word in card ['words']:
+                        words.Add ((word, card_id))
+
+                    # reservoir sample of cards (compression dictionary)
+                    if base is not None:
+                        pass # compression dictionary of base is used
+                    elif card_id < cls.zdict_samples:
+                        samples.append (CardEncode (card))
+                    else:
+                        sample_id = samples_random.randint (0, card_id)
+                        if sample_id < cls.zdict_samples:
+                            samples [sample_id] = CardEncode (card)
+                cards_total = len (cards_offset) - 1
+                fingerprint_size = len (cards_fingerprint) // cards_total if cards_fingerprint and cards_total else 0
+
+                def card_base (card_id):
+                    """Entry of base card (None if card is not taken from base)
+                    """
+                    desc = cards_base [card_id]
+                    if not desc:
+                        return None
+                    return (desc,) if base.layout == 'card' else (desc, cards_base_slot [card_id])
+
+                # compression dictionary
+                phase ('train')
+                if base is not None:
+                    zdict = base.zdict
+                else:
+                    zdict = CardDictTrain (samples) if card_zdict and samples else None
+                del samples
+                if zdict:
+                    store.SaveByName (cls.zdict_name, zdict)
+                else:
+                    zdict = None
+
+                # numerate cards (word followed by equal word of later card is not
+                # put into word index, so the last card wins as in source order),
+                # numbers of the card are stored in a flat array starting at offset
+                # of the card
+                phase ('sort')
+                words_count = len (words)
+                cards_numbers, cards_numbers_offset = array.array ('I', [0]) * words_count, array.array ('L', [0])
+                for count in cards_words:
+                    cards_numbers_offset.append (cards_numbers_offset [-1] + count)
+                cards_numbers_next = cards_numbers_offset [:-1]
+                del cards_words
+
+                def card_numbers (card_id):
+                    return cards_numbers [cards_numbers_offset [card_id]:cards_numbers_offset [card_id + 1]].tolist ()
+
+                # fuzzy variants of headwords (variant -> headwords)
+                if not fuzzy_index:
+                    fuzzy_add = None
+                elif memory is None:
+                    fuzzy_words = {}
+                    fuzzy_add = lambda variant, word: fuzzy_words.setdefault (variant, []).append (word)
+                    fuzzy_groups = lambda: fuzzy_words.items ()
+                else:
+                    fuzzy_words = ExternalSort (memory)
+                    fuzzy_add = lambda variant, word: fuzzy_words.Add ((variant, word))
+                    fuzzy_groups = lambda: ((variant, [word for _, word in group]) for variant, group in
+                        itertools.groupby (fuzzy_words.Sorted (), lambda pair: pair [0]))
+
+                # indexed words with their numbers (sorted input of word and folded indexes)
+                index_words, index_folds = ExternalSort (memory), ExternalSort (memory)
+                def index_add (word, number):
+                    index_words.Add ((word, number))
+                    index_folds.Add ((FoldKey (word), number))
+
+                word_prev = None
+                for number, (word, card_id) in enumerate (words.Sorted ()):
+                    cards_numbers [cards_numbers_next [card_id]] = number
+                    cards_numbers_next [card_id] += 1
+                    if word != word_prev:
+                        if word_prev is not None:
+                            index_add (word_prev, number - 1)
+                        if fuzzy_add is not None:
+                            for variant in FuzzyVariants (word, cls.fuzzy_distance, cls.fuzzy_prefix):
+                                fuzzy_add (variant, word)
+                    word_prev = word
+                if word_prev is not None:
+                    index_add (word_prev, words_count - 1)
+                del words, cards_numbers_next
+
+                # fuzzy index (variant -> zero separated headwords)
+                if fuzzy_add is not None:
+                    phase ('fuzzy_index')
+                    variants_index = store.Mapping (cls.fuzzy_index_name, key_type = 'bytes', value_type = 'bytes')
+                    for variant, variant_words in fuzzy_groups ():
+                        variants_index [variant.encode ('utf-8')] = '\0'.join (variant_words).encode ('utf-8')
+                    fuzzy_words = fuzzy_groups = None # referenced by closures (can not be deleted)
+                    variants_index.Dispose ()
+                    fuzzy_index_size = variants_index.SizeOnStore
+
+                # index entries (entries are written to temporary file by number, and
+                # indexes are built from it once all cards are saved)
+                entry_type = 'struct:>QH' if block_size is None else 'struct:>QHH'
+                entry_struct = struct.Struct (entry_type [len ('struct:'):])
+
+                # encoded data of base cards is reused if they do not store numbers, and
+                # compressed data if it has been compressed the same way
+                base_encoded = base is not None and not base.card_numbers
+                blobs_reusable = base_encoded and base.layout == 'card' and block_size is None
+
+                def card_read (card_id):
+                    """Card (None if it has not been decoded) and its encoded data
+                    """
+                    base_entry = card_base (card_id)
+                    if base_entry is None:
+                        spill.seek (cards_offset [card_id])
+                        card = json.loads (spill.read (cards_offset [card_id + 1] - cards_offset [card_id]).decode ('utf-8'))
+                    elif not base_encoded:
+                        card = dict (base.card_load (*base_entry)) # base cards are shared with its cache
+                        card.pop ('numbers', None)
+                    elif base.layout == 'block':
+                        return None, base.block_load (base_entry [0]) [base_entry [1]]
+                    else:
+                        return None, CardDecompress (base.blob_load (base_entry [0]), base.zdict)
+                    return card, CardEncode (card)
+
+                # full-text postings (token -> numbers of the first words of cards)
+                if not text_index:
+                    text_add = None
+                elif memory is None:
+                    text_postings = {}
+                    text_add = lambda token, number: text_postings.setdefault (token, []).append (number)
+                    text_groups = lambda: ((token, sorted (numbers)) for token, numbers in sorted (text_postings.items ()))
+                else:
+                    text_postings = ExternalSort (memory)
+                    text_add = lambda token, number: text_postings.Add ((token, number))
+                    text_groups = lambda: ((token, [number for _, number in group]) for token, group in
+                        itertools.groupby (text_postings.Sorted (), lambda pair: pair [0]))
+
+                # (card descriptor without slot is stored as a single value)
+                fingerprint_index = None if cards_fingerprint is None else \
+                    store.Mapping (cls.fingerprint_index_name, key_type = 'bytes', value_type = entry_type [:-1])
+
+                def card_index (card_id, card, card_data, entry):
+                    if fingerprint_index is not None:
+                        fingerprint = bytes (cards_fingerprint [card_id * fingerprint_size:(card_id + 1) * fingerprint_size])
+                        fingerprint_index [fingerprint] = entry if len (entry) > 1 else entry [0]
+                    numbers = card_numbers (card_id)
+                    for index, number in enumerate (numbers):
+                        index_entries.seek (number * entry_struct.size)
+                        index_entries.write (entry_struct.pack (*(entry + (index,))))
+
+                    if text_add is not None and numbers:
+                        for token in CardTokens (CardDecode (card_data) if card is None else card):
+                            text_add (token, numbers [0])
+
+                # save cards
+                phase ('save')
+                data_size = len (zdict) if zdict else 0
+                if block_size is None:
+                    for card_id in range (cards_total):
+                        base_entry = card_base (card_id) if blobs_reusable else None
+                        if base_entry is not None:
+                            blob = bytes (base.blob_load (base_entry [0]))
+                            card_desc = store.Save (blob)
+                            card, card_data = None, None if text_add is None else CardDecompress (blob, zdict)
+                            Metrics.Count ('compile', 'blobs_reused')
+                        else:
+                            card, card_data = card_read (card_id)
+                            card_desc = store.Save (CardCompress (card_data, zdict))
+                        data_size += StoreBlock.FromDesc (card_desc).size
+                        card_index (card_id, card, card_data, (card_desc,))
+
+                        report_changed (.5 + (card_id + 1) / (2. * cards_total))
+
+                else:
+                    # cards are packed into blocks in order of their first words
+                    cards_order = array.array ('l', [-1]) * words_count # card by number of its first word
+                    for card_id in range (cards_total):
+                        if cards_numbers_offset [card_id] < cards_numbers_offset [card_id + 1]:
+                            cards_order [cards_numbers [cards_numbers_offset [card_id]]] = card_id
+                    cards_order = array.array ('l', (card_id for card_id in cards_order if card_id >= 0))
+
+                    block_cards, block_data = [], []
+                    def block_save ():
+                        block_desc = store.Save (CardCompress (CardBlockEncode (block_data), zdict))
+                        for slot, ((card_id, card), card_data) in enumerate (zip (block_cards, block_data)):
+                            card_index (card_id, card, card_data, (block_desc, slot))
+                        del block_cards [:], block_data [:]
+                        return StoreBlock.FromDesc (block_desc).size
+
+                    block_data_size = 0
+                    for cards_count, card_id in enumerate (cards_order, 1):
+                        card, card_data = card_read (card_id)
+                        block_cards.append ((card_id, card if text_add is not None else None))
+                        block_data.append (card_data)
+                        block_data_size += len (card_data)
+                        if block_data_size >= block_size or len (block_cards) >= cls.block_slots_max:
+                            data_size += block_save ()
+                            block_data_size = 0
+
+                        report_changed (.5 + cards_count / (2. * len (cards_order)))
+
+                    if block_cards:
+                        data_size += block_save ()
+
+                # indexes (built bottom-up from sorted input)
+                phase ('index')
+                index_entries.flush ()
+                entries = mmap.mmap (index_entries.fileno (), 0, access = mmap.ACCESS_READ) if words_count else b''
+                try:
+                    entry_load = lambda number: entry_struct.unpack_from (entries, number * entry_struct.size)
+
+                    # number index is the array of entries itself
+                    number_desc = store.Save (entries [:])
+
+                    # word entries are followed by number of the word (slices are resolved without cards)
+                    index_format = entry_type [len ('struct:'):] + 'I'
+                    word_tree = DictionaryTree.Build (store, ((word.encode ('utf-8'), entry_load (number) + (number,))
+                        for word, number in index_words.Sorted ()), index_format)
+                    fold_tree = DictionaryTree.Build (store, ((key, entry_load (number) + (number,))
+                        for key, number in index_folds.Sorted ()), index_format)
+                finally:
+                    if words_count:
+                        entries.close ()
+                index_words = index_folds = None
+
+                # full-text index (token -> descriptor of postings, filled in order of tokens)
+                if text_add is not None:
+                    phase ('text_index')
+                    postings_index = store.Mapping (cls.text_index_name, key_type = 'bytes', value_type = 'struct:>Q')
+                    text_index_size = 0
+                    for token, numbers in text_groups ():
+                        postings_desc = store.Save (PostingsEncode (numbers))
+                        text_index_size += StoreBlock.FromDesc (postings_desc).size
+                        postings_index [token.encode ('utf-8')] = postings_desc
+                    text_postings = text_groups = None
+                    postings_index.Dispose ()
+                    text_index_size += postings_index.SizeOnStore
 
             report_changed (1)
 
             # flush indexes (otherwise on store size will be inaccurate)
-            word_index.Dispose ()
-            number_index.Dispose ()
+            phase ('flush')
+            if fingerprint_index is not None:
+                fingerprint_index.Dispose ()
 
             # info
-            store.SaveByName (cls.info_name, json.dumps ({
+            info = {
                 'name'              : source.Name,
                 'language'          : source.Language,
-                'size'              : next (number_next),
+                'size'              : words_count,
                 'data_size'         : data_size,
-                'number_index_size' : number_index.SizeOnStore,
-                'word_index_size'   : word_index.SizeOnStore,
-            }).encode ('utf-8'))
+                'number_index_size' : StoreBlock.FromDesc (number_desc).size,
+                'number_array'      : (number_desc, entry_type [len ('struct:'):]),
+                'word_index_size'   : word_tree [1],
+                'word_index_tree'   : (word_tree [0], index_format),
+                'word_index_numbers': 'entry',
+                'fold_index_size'   : fold_tree [1],
+                'fold_index_tree'   : (fold_tree [0], index_format),
+                'card_format'       : cls.card_format,
+                'card_compression'  : 'zlib' if zdict is None else 'zdict',
+                'card_numbers'      : False,
+                'layout'            : 'card' if block_size is None else 'block',
+                'store_probe'       : probe_desc,
+            }
+            if fuzzy_index:
+                info ['fuzzy_index_size'] = fuzzy_index_size
+                info ['fuzzy_distance'] = cls.fuzzy_distance
+                info ['fuzzy_prefix'] = cls.fuzzy_prefix
+            if text_index:
+                info ['text_index_size'] = text_index_size
+            if fingerprint_index is not None:
+                info ['fingerprint_index_size'] = fingerprint_index.SizeOnStore
+                info ['fingerprint_version'] = source.fingerprint_version
+            store.SaveByName (cls.info_name, json.dumps (info).encode ('utf-8'))
+            phase (None)
+
+            peak_memory = Metrics.PeakMemory ()
+            if peak_memory is not None:
+                Metrics.Gauge ('compile', 'peak_rss', peak_memory)
+
+        return cls (dst)
+
+    @classmethod
+    def compile_base (cls, base, source):
+        """Open base dictionary for compilation of source
+
+        Returns None if there is no base or it can not be used (it has no
+        fingerprints of the same version or its cards are encoded differently).
+        """
+        if base is None or not os.path.exists (base):
+            return None
+        base = cls (base, cache_size = 0)
+        if (base.fingerprint_version != source.fingerprint_version or
+            base.card_format != cls.card_format or
+            base.card_compression != ('zdict' if card_zdict else 'zlib')):
+            base.Dispose ()
+            return None
+        return base
+
+    @classmethod
+    def Link (cls, src, dst, report = None, memory = None):
+        """Create dictionary which reads cards directly from source file
+
+        Only word, folded and number indexes are created, their entries point
+        to entries of source index file, so no cards are copied. Source files
+        must stay in place and unchanged (changed source is detected when the
+        first card is loaded, see "SourceCheck"). Only DICT sources can be
+        linked, dictionaries created this way have neither suggestions nor
+        full-text index.
+        "memory" is approximate budget in bytes for sorting of source entries
+        and folded words (see "Compile").
+        """
+        report_changed = dictionary_report (report)
+
+        source = Source (src)
+        if source is None:
+            raise DictionaryError ('Unsupported dictionary format \'{}\''.format (os.path.basename (src)))
+        if not isinstance (source, DICTSource):
+            source.Dispose ()
+            raise DictionaryError ('Dictionary format can not be linked \'{}\''.format (os.path.basename (src)))
+
+        with source, FileStore (dst, mode = 'n', offset = len (cls.magic)) as store:
+            store.SaveByOffset (0, cls.magic)
+            probe_desc = cls.store_probe (store)
+
+            phase = Metrics.Phases ('link')
+
+            # numerate entries (the last of equal words is put into word index)
+            phase ('parse')
+            words = ExternalSort (memory)
+            for word, position in source.Entries (lambda value: report_changed (value / 2.)):
+                words.Add ((word, position))
+            words_count = len (words)
+
+            # create indexes (entry is position of source entry followed by number
+            # and index of the word inside card, number array is written to temporary
+            # file until it is complete, indexes are built bottom-up from sorted input)
+            phase ('index')
+            entry_type = 'struct:>QIH'
+            entry_struct = struct.Struct (entry_type [len ('struct:'):])
+            index_format = entry_type [len ('struct:'):] + 'I'
+            folds = ExternalSort (memory)
+
+            with tempfile.TemporaryFile () as numbers:
+                def words_indexed (words):
+                    """Indexed words with their entries (the last of equal words)
+                    """
+                    word_prev, entry_prev = None, None
+                    for number, (word, position) in enumerate (words.Sorted ()):
+                        entry = (position, number, 0)
+                        if word_prev is not None and word != word_prev:
+                            yield word_prev, entry_prev + (entry_prev [1],)
+                        word_prev, entry_prev = word, entry
+                        numbers.write (entry_struct.pack (*entry))
+
+                        if not number & 0xfff:
+                            report_changed (.5 + number / (2. * words_count))
+                    if word_prev is not None:
+                        yield word_prev, entry_prev + (entry_prev [1],)
+
+                def words_folded (words, folds):
+                    for word, entry in words:
+                        folds.Add ((FoldKey (word), entry))
+                        yield word.encode ('utf-8'), entry
+
+                word_tree = DictionaryTree.Build (store, words_folded (words_indexed (words), folds), index_format)
+                del words
+                fold_tree = DictionaryTree.Build (store, folds.Sorted (), index_format)
+                del folds
+
+                # number index (array of entries)
+                numbers.seek (0)
+                number_desc = store.Save (numbers.read ())
+            report_changed (1)
+
+            # info
+            info = {
+                'name'              : source.Name,
+                'language'          : source.Language,
+                'size'              : words_count,
+                'data_size'         : 0,
+                'number_index_size' : StoreBlock.FromDesc (number_desc).size,
+                'number_array'      : (number_desc, entry_type [len ('struct:'):]),
+                'word_index_size'   : word_tree [1],
+                'word_index_tree'   : (word_tree [0], index_format),
+                'word_index_numbers': 'entry',
+                'fold_index_size'   : fold_tree [1],
+                'fold_index_tree'   : (fold_tree [0], index_format),
+                'layout'            : 'source',
+                'source'            : cls.source_info (source),
+                'store_probe'       : probe_desc,
+            }
+            store.SaveByName (cls.info_name, json.dumps (info).encode ('utf-8'))
+            phase (None)
 
         return cls (dst)
 
@@ -159,6 +676,57 @@ class Dictionary (object):
         """
         return self.number_index
 
+    def Suggest (self, word, count = 5):
+        """Headwords nearest to the word
+
+        Returns at most "count" (distance, headword) pairs within edit distance
+        of the fuzzy index ordered by distance. Dictionaries compiled without
+        fuzzy index have no suggestions.
+        """
+        if self.fuzzy_index is None or not word:
+            return []
+
+        distances = {}
+        for variant in FuzzyVariants (word, self.fuzzy_distance, self.fuzzy_prefix):
+            variant_words = self.fuzzy_index.get (variant.encode ('utf-8'))
+            if not variant_words:
+                continue
+            for candidate in bytes (variant_words).decode ('utf-8').split ('\0'):
+                if candidate not in distances:
+                    distances [candidate] = FuzzyDistance (word, candidate, self.fuzzy_distance)
+
+        return sorted ((distance, candidate) for candidate, distance in distances.items ()
+            if distance is not None) [:count]
+
+    def Search (self, text, count = None):
+        """Cards whose translations contain all words of the text
+
+        Returns at most "count" (word, card) pairs in headword order. Words
+        are matched regardless of case and diacritics. Dictionaries compiled
+        without full-text index have no matches.
+        """
+        tokens = TextTokens (text)
+        if self.text_index is None or not tokens:
+            return []
+
+        # intersect postings starting from the shortest
+        postings = []
+        for token in tokens:
+            postings_desc = self.text_index.get (token.encode ('utf-8'))
+            if not postings_desc:
+                return []
+            postings.append (self.blob_load (postings_desc))
+        postings.sort (key = len)
+
+        numbers = PostingsDecode (postings [0])
+        for data in postings [1:]:
+            if not numbers:
+                break
+            numbers_set = set (numbers)
+            numbers = [number for number in PostingsDecode (data) if number in numbers_set]
+
+        return [self.number_index [number] for number in numbers [:count]]
+
     #--------------------------------------------------------------------------#
     # Properties                                                               #
     #--------------------------------------------------------------------------#
@@ -194,13 +762,247 @@ class Dictionary (object):
         """
         return self.file
 
+    @property
+    def TextIndexed (self):
+        """Whether dictionary has full-text index
+        """
+        return self.text_index is not None
+
+    @property
+    def SourceFiles (self):
+        """Location and state of linked source files (None if dictionary is not linked)
+        """
+        return self.source_files
+
+    @staticmethod
+    def SourceCheck (files):
+        """Check that linked source files have not changed
+
+        Files with the same size and modification time are not read, otherwise
+        their content fingerprints are compared. Raises DictionaryError if
+        files are missing or have changed, returns files with current
+        modification time.
+        """
+        files_checked = {}
+        for name, info in files.items ():
+            try:
+                stat = os.stat (info ['path'])
+            except OSError:
+                raise DictionaryError ('Linked source file is missing: {}'.format (info ['path']))
+            if stat.st_size != info ['size'] or (stat.st_mtime != info ['mtime'] and
+                    Dictionary.source_fingerprint (info ['path'], stat.st_size) != info ['fingerprint']):
+                raise DictionaryError ('Linked source file has changed (reinstall dictionary): {}'
+                    .format (info ['path']))
+            files_checked [name] = dict (info, mtime = stat.st_mtime)
+        return files_checked
+
+    @property
+    def Mapped (self):
+        """Whether cards are read from memory mapped file
+        """
+        return self.view is not None
+
+    @property
+    def Cache (self):
+        """Cache of decoded cards
+        """
+        return self.cache
+
+    @property
+    def CacheStats (self):
+        """Cache hits and misses
+        """
+        return self.cache.Hits, self.cache.Misses
+
     #--------------------------------------------------------------------------#
     # Private                                                                  #
     #--------------------------------------------------------------------------#
-    def card_load (self, desc):
-        """Load card by it's descriptor
+    def card_load (self, desc, slot = None):
+        """Load card by it's descriptor (and slot inside block for block layout or
+        number of the word for source layout, which only keys the cache)
+
+        Returned card is shared with cache and must not be modified.
+        """
+        key = desc if slot is None else (desc, slot)
+        card = self.cache.Get (key)
+        if card is None:
+            Metrics.Count (self.name, 'cache_misses')
+            if self.source_files is not None:
+                # descriptor is position of source entry
+                if self.source is None:
+                    self.source_open ()
+                with Metrics.Span (self.name, 'read'):
+                    card, size = self.source.CardAt (desc)
+                return self.cache.Set (key, card, size)
+            elif slot is None:
+                data = self.blob_load (desc)
+                with Metrics.Span (self.name, 'decompress'):
+                    data = CardDecompress (data, self.zdict)
+            else:
+                data = self.block_load (desc) [slot]
+            with Metrics.Span (self.name, 'decode'):
+                card = self.card_decode (data)
+            card = self.cache.Set (key, card, len (data))
+        else:
+            Metrics.Count (self.name, 'cache_hits')
+        return card
+
+    def block_load (self, desc):
+        """Load block of encoded cards by it's descriptor
+        """
+        block = self.blocks.Get (desc)
+        if block is None:
+            Metrics.Count (self.name, 'block_misses')
+            data = self.blob_load (desc)
+            with Metrics.Span (self.name, 'decompress'):
+                data = CardDecompress (data, self.zdict)
+            block = self.blocks.Set (desc, CardBlockDecode (data), len (data))
+        else:
+            Metrics.Count (self.name, 'block_hits')
+        return block
+
+    def blob_load (self, desc):
+        """Load stored data by it's descriptor
+
+        Returns memory view of the mapped file if dictionary is mapped (it
+        must not be kept, mapping can not be closed while it is referenced).
         """
-        return json.loads (zlib.decompress (self.store.Load (desc)).decode ('utf-8'))
+        if self.view is None:
+            with Metrics.Span (self.name, 'read'):
+                data = self.store.Load (desc)
+        else:
+            block = StoreBlock.FromDesc (desc)
+            offset = self.store_origin + block.offset
+            data = self.view [offset:offset + block.used]
+        Metrics.Count (self.name, 'bytes_read', len (data))
+        return data
+
+    def blob_read (self, desc, offset, size):
+        """Read region of stored data by it's descriptor
+
+        Returns bytes (region is copied if dictionary is mapped).
+        """
+        block = StoreBlock.FromDesc (desc)
+        offset += self.store_origin + block.offset
+        if self.view is None:
+            with Metrics.Span (self.name, 'read'):
+                data = self.store.LoadByOffset (offset, size)
+        else:
+            data = bytes (self.view [offset:offset + size])
+        Metrics.Count (self.name, 'bytes_read', len (data))
+        return data
+
+    def map (self):
+        """Memory map dictionary file
+
+        Descriptors are resolved to regions of the mapping directly (relative
+        to stored data origin, see "store_origin_find"), which is verified
+        against store on one of the stored cards. If verification
+        fails, dictionary continues to read cards through the store.
+        """
+        with io.open (self.file, 'rb') as stream:
+            self.mmap = mmap.mmap (stream.fileno (), 0, access = mmap.ACCESS_READ)
+        try:
+            self.view = memoryview (self.mmap)
+        except TypeError:
+            self.view = self.mmap # no new buffer interface (slices are copied)
+
+        try:
+            for word, entry in self.word_index.index [b'':]:
+                if bytes (self.blob_load (entry [0])) != self.store.Load (entry [0]):
+                    raise ValueError ('Mapped data does not match stored data')
+                break
+        except (AttributeError, TypeError, ValueError, zlib.error):
+            self.pages.Clear () # pages of index trees might have been read from the mapping
+            self.pages_inner.clear ()
+            self.unmap ()
+
+    def unmap (self):
+        """Release memory mapping
+        """
+        if self.view is not None and self.view is not self.mmap:
+            self.view.release ()
+        self.view = None
+        if self.mmap is not None:
+            self.mmap.close ()
+            self.mmap = None
+
+    def tree_open (self, tree):
+        """Open word or folded index tree (see "DictionaryTree")
+        """
+        root, entry_format = tree
+        return DictionaryTree (lambda desc: self.blob_read (desc, 0, StoreBlock.FromDesc (desc).used),
+            self.pages, self.pages_inner, root, entry_format)
+
+    @classmethod
+    def store_probe (cls, store):
+        """Save probe of unique content, its descriptor locates stored data in the file
+        """
+        return store.Save (cls.store_probe_prefix + os.urandom (16))
+
+    def store_origin_find (self, probe_desc):
+        """Offset of stored data in the file
+
+        Descriptors are relative to stored data, which is preceded by store
+        header of size private to store. So stored data origin is found as
+        offset of the probe content (see "store_probe") in the file relative to
+        offset of the probe in stored data.
+        """
+        probe, block = self.store.Load (probe_desc), StoreBlock.FromDesc (probe_desc)
+        size = min (self.store_origin_max + len (probe), os.path.getsize (self.file) - block.offset)
+        origin = self.store.LoadByOffset (block.offset, size).find (probe)
+        if origin < 0 or not probe.startswith (self.store_probe_prefix):
+            raise DictionaryError ('Stored data can not be located: {}'.format (self.file))
+        return origin
+
+    @staticmethod
+    def source_info (source):
+        """Location and state of linked source files
+        """
+        files = {}
+        for name, path in (('data', source.datafile), ('index', source.indexfile)):
+            stat = os.stat (path)
+            files [name] = {
+                'path'       : os.path.abspath (path),
+                'size'       : stat.st_size,
+                'mtime'      : stat.st_mtime,
+                'fingerprint': Dictionary.source_fingerprint (path, stat.st_size),
+            }
+        return files
+
+    @classmethod
+    def source_fingerprint (cls, path, size):
+        """Fingerprint of file content
+
+        Small files are hashed completely, larger ones by evenly spaced
+        samples (including the first and the last), so fingerprint costs about
+        the same for any file size.
+        """
+        digest = hashlib.sha1 ()
+        with io.open (path, 'rb') as stream:
+            if size <= cls.source_sample_size * cls.source_samples:
+                digest.update (stream.read ())
+            else:
+                step = (size - cls.source_sample_size) // (cls.source_samples - 1)
+                for sample in range (cls.source_samples):
+                    stream.seek (sample * step)
+                    digest.update (stream.read (cls.source_sample_size))
+        return digest.hexdigest ()
+
+    def source_open (self):
+        """Open linked source (fails if source files have changed)
+        """
+        files = self.SourceCheck (self.source_files)
+        self.source = DICTSource (files ['data']['path'], files ['index']['path'])
+
+    def entry_load (self, entry):
+        """Load word and card by index entry
+
+        Entry is a card descriptor (with slot for block layout) followed by
+        index of the word inside the card.
+        """
+        card = self.card_load (*entry [:-1])
+        return card ['words'][entry [-1]], card
 
     #--------------------------------------------------------------------------#
     # Disposable                                                               #
@@ -208,6 +1010,9 @@ class Dictionary (object):
     def Dispose (self):
         """Dispose dictionary
         """
+        self.unmap ()
+        if self.source is not None:
+            self.source.Dispose ()
         self.store.Dispose ()
 
     def __enter__ (self):
@@ -217,45 +1022,427 @@ class Dictionary (object):
         self.Dispose ()
         return False
 
+def dictionary_report (report):
+    """Report function which skips unchanged (rounded) values
+    """
+    if not report:
+        return lambda _: None
+
+    report_value = [0]
+    def report_changed (value):
+        value = round (value, 3)
+        if report_value [0] != value:
+            report_value [0] = value
+            report (value)
+    return report_changed
+
 #------------------------------------------------------------------------------#
 # DictionaryIndex                                                              #
 #------------------------------------------------------------------------------#
+def FoldKey (word):
+    """Key of the word in folded index
+
+    Key is utf-8 encoded folded word followed by zero byte and the word
+    itself, so all variants of the folded word are adjacent in the index.
+    """
+    return b'\0'.join ((Fold (word).encode ('utf-8'), word.encode ('utf-8')))
+
 class DictionaryIndex (object):
     """Dictionary index
+
+    Word index can have secondary folded index (see "FoldKey"), which is
+    used when there is no exact match. Number of the word (used to slice
+    index) is stored depending on "numbers": 'entry' - as the last field of
+    index entries, 'key' - it is the key of index itself, None - it is only
+    stored in the card (card is loaded to find it).
     """
     none_entry = (None, None)
+    walk_max = 8 # entries walked forward before searching index again
 
-    def __init__ (self, dct, index, cast = None):
+    def __init__ (self, dct, index, cast = None, fold_index = None, numbers = None):
         self.dct = dct
         self.index = index
         self.cast = cast or (lambda key: key)
+        self.fold_index = fold_index
+        self.numbers = numbers
 
     def __getitem__ (self, key):
         if not isinstance (key, slice):
-            desc, index = self.index.get (self.cast (key), self.none_entry)
-            if not desc:
-                return (None, None)
+            with Metrics.Span (self.dct.name, 'index'):
+                entry = self.index.get (self.cast (key))
+                if not entry:
+                    entry = next (self.Folded (key), self.none_entry) [1]
+            if not entry:
+                return self.none_entry
 
-            card = self.dct.card_load (desc)
-            return card ['words'][index], card
+            return self.dct.entry_load (entry [:-1] if self.numbers == 'entry' else entry)
 
         else:
-            number_start, number_stop = None, None
-            try:
-                card_desc, word_index = next (self.index [self.cast (key.start):]) [1]
-                number_start = self.dct.card_load (card_desc) ['numbers'][word_index]
-
-                card_desc, word_index= next (self.index [self.cast (key.stop):]) [1]
-                number_stop  = self.dct.card_load (card_desc) ['numbers'][word_index]
-            except StopIteration: pass
+            number_start, number_stop = self.number (key.start), None
+            if number_start is not None and key.stop is not None:
+                number_stop = self.number (key.stop)
 
             return CardRange (self.dct, number_start, number_stop)
 
+    def GetMany (self, keys):
+        """Get many keys at once
+
+        Returns list of (word, card) pairs (or none entries) in order of keys.
+        Unique keys are looked up in sorted order by walking the index forward
+        from the previous key (index is searched again only if the next key is
+        far ahead), and each card is loaded once even if cache is disabled.
+        None and empty keys are not looked up (none entries are returned).
+        """
+        found, cards = [self.none_entry] * len (keys), {}
+        key_positions = {}
+        for position, key in enumerate (keys):
+            if key is not None and key != '':
+                key_positions.setdefault (key, []).append (position)
+
+        cursor, cursor_key, cursor_entry = None, None, None
+        for key in sorted (key_positions):
+            index_key = self.cast (key)
+
+            # walk forward or search again (key is None if index is exhausted)
+            with Metrics.Span (self.dct.name, 'index'):
+                steps = self.walk_max
+                while cursor_key is not None and cursor_key < index_key and steps:
+                    cursor_key, cursor_entry = next (cursor, self.none_entry)
+                    steps -= 1
+                if cursor_key is None or cursor_key < index_key:
+                    cursor = self.index [index_key:]
+                    cursor_key, cursor_entry = next (cursor, self.none_entry)
+
+                entry = cursor_entry if cursor_key == index_key else None
+                if not entry:
+                    entry = next (self.Folded (key), self.none_entry) [1]
+            if not entry:
+                continue
+            if self.numbers == 'entry':
+                entry = entry [:-1]
+
+            card_key = tuple (entry [:-1])
+            card = cards.get (card_key)
+            if card is None:
+                card = self.dct.card_load (*card_key)
+                cards [card_key] = card
+            for position in key_positions [key]:
+                found [position] = card ['words'][entry [-1]], card
+
+        return found
+
+    def Folded (self, word):
+        """Entries of all words with the same folded form
+
+        Yields (utf-8 encoded word, entry) pairs with a single probe of folded
+        index, nothing if index has no folded index.
+        """
+        if self.fold_index is None or not word:
+            return
+        prefix = Fold (word).encode ('utf-8') + b'\0'
+        for key, entry in self.fold_index [prefix:]:
+            if not key.startswith (prefix):
+                break
+            yield key [len (prefix):], entry
+
+    def number (self, key):
+        """Number of the first word not less than the key (None if there is no such word)
+        """
+        with Metrics.Span (self.dct.name, 'index'):
+            index_key, entry = next (self.index [self.cast (key):], self.none_entry)
+        if entry is None:
+            return None
+        elif self.numbers == 'entry':
+            return entry [-1]
+        elif self.numbers == 'key':
+            return index_key
+        return self.dct.entry_load (entry) [1]['numbers'][entry [-1]]
+
+#------------------------------------------------------------------------------#
+# Dictionary Array                                                             #
+#------------------------------------------------------------------------------#
+class DictionaryArray (object):
+    """Fixed-width array of index entries by number
+
+    Read-only mapping from number to entry, which is accessed and sliced the
+    same way as stored index. Entries are read on demand by "data_read"
+    (called with offset and size of the region of "data_size" bytes), slices
+    are read in chunks of "chunk_size" entries, so no data is kept between
+    accesses.
+    """
+    chunk_size = 256
+
+    def __init__ (self, data_read, data_size, entry_format):
+        self.data_read = data_read
+        self.entry = struct.Struct (str (entry_format))
+        self.size = data_size // self.entry.size
+
+    def get (self, number, default = None):
+        """Entry by number
+        """
+        if not 0 <= number < self.size:
+            return default
+        return self.entry.unpack (self.data_read (number * self.entry.size, self.entry.size))
+
+    def __getitem__ (self, key):
+        """Iterate over (number, entry) pairs of numbers slice
+        """
+        if not isinstance (key, slice):
+            raise TypeError ('Only slices are supported')
+        start = 0 if key.start is None else max (key.start, 0)
+        stop = self.size if key.stop is None else min (key.stop, self.size)
+        return self.entries (start, stop)
+
+    def __len__ (self):
+        return self.size
+
+    def entries (self, start, stop):
+        unpack, size = self.entry.unpack_from, self.entry.size
+        for chunk_start in range (start, stop, self.chunk_size):
+            chunk_stop = min (chunk_start + self.chunk_size, stop)
+            data = self.data_read (chunk_start * size, (chunk_stop - chunk_start) * size)
+            for number in range (chunk_start, chunk_stop):
+                yield number, unpack (data, (number - chunk_start) * size)
+
+#------------------------------------------------------------------------------#
+# Dictionary Tree                                                              #
+#------------------------------------------------------------------------------#
+class DictionaryTree (object):
+    """Static B+tree of sorted keys
+
+    Read-only mapping from bytes key to entry, which is accessed and sliced
+    the same way as stored index. Tree is built bottom-up from sorted items
+    (see "Build"), so every page but the last one of each level is filled
+    up to "page_size" (leaves) or "page_inner_size" (inner pages) bytes of
+    compressed data. Keys of inner pages are the shortest prefixes which
+    separate their children. Pages are read by "page_read"
+    (called with descriptor of the page), decompressed leaves are kept in
+    shared "pages" cache and inner pages (every lookup passes through them,
+    and there are about a hundred times fewer of them than of leaves) are
+    kept in shared "pages_inner" dictionary.
+    """
+    page_size = 1024
+    page_inner_size = 4096
+    page_compression = 9
+    page_count_max = (1 << 16) - 1
+    page_data_max = (1 << 15) - 1 # raw size of page entries and of a single key (end offsets of keys are 16-bit)
+    page_header = struct.Struct ('>BH') # level (zero for leaves) and count of keys
+    page_child = struct.Struct ('>Q')   # descriptor of child page (values of inner pages)
+
+    def __init__ (self, page_read, pages, pages_inner, root, entry_format):
+        self.page_read = page_read
+        self.pages = pages
+        self.pages_inner = pages_inner
+        self.root = root
+        self.entry = struct.Struct (str (entry_format))
+
+    @classmethod
+    def Build (cls, store, items, entry_format):
+        """Build tree from (key, entry) items sorted by key
+
+        Items are consumed once, only the last page of each level is kept in
+        memory. Returns descriptor of the root page (zero if there are no items) and
+        size occupied on store.
+        """
+        entry = struct.Struct (str (entry_format))
+        levels, levels_size, levels_limit = [], [], [] # pending entries, their size and size of full page
+        size, leaf_last = [0], [None]
+
+        def page_flush (level):
+            """Save page of as many pending entries of the level as fit
+            """
+            entries, page_size = levels [level], cls.page_inner_size if level else cls.page_size
+            count = len (entries)
+            while True:
+                data = zlib.compress (cls.page_encode (level, entries [:count]), cls.page_compression)
+                if len (data) <= page_size or count == 1:
+                    break
+                count = max (1, min (count - 1, count * page_size // len (data)))
+
+            # size of the next page is estimated by compression ratio of this one
+            data_size = sum (len (key) + len (value) + 2 for key, value in entries [:count])
+            levels_size [level] -= data_size
+            levels_limit [level] = min (max (data_size * page_size // len (data), page_size), cls.page_data_max)
+
+            # separator of leaf is the shortest prefix of its first key greater than the last
+            # key of the previous leaf (separator of inner page is the one of its first leaf)
+            key = entries [0][0]
+            if not level:
+                if leaf_last [0] is not None:
+                    prefix = next ((index for index, (last, first) in enumerate (zip (leaf_last [0], key))
+                        if last != first), len (leaf_last [0]))
+                    key = key [:prefix + 1]
+                leaf_last [0] = entries [count - 1][0]
+            del entries [:count]
+            desc = store.Save (data)
+            size [0] += StoreBlock.FromDesc (desc).size
+            return desc, key
+
+        def page_add (level, key, value):
+            if level == len (levels):
+                levels.append ([])
+                levels_size.append (0)
+                levels_limit.append (cls.page_data_max)
+            levels [level].append ((key, value))
+            levels_size [level] += len (key) + len (value) + 2
+            if levels_size [level] >= levels_limit [level] or len (levels [level]) >= cls.page_count_max:
+                desc, key = page_flush (level)
+                page_add (level + 1, key, cls.page_child.pack (desc))
+
+        key_prev = None
+        for key, value in items:
+            if key_prev is not None and key <= key_prev:
+                raise DictionaryError ('Tree keys are not sorted: {!r}'.format (key))
+            elif len (key) > cls.page_data_max:
+                raise DictionaryError ('Tree key is too long: {!r}'.format (key [:64]))
+            key_prev = key
+            page_add (0, key, entry.pack (*value))
+
+        # save pending pages from the bottom (the only page of the top level is the root)
+        level = 0
+        while level < len (levels):
+            while levels [level]:
+                desc, key = page_flush (level)
+                if level + 1 == len (levels) and not levels [level]:
+                    return desc, size [0]
+                page_add (level + 1, key, cls.page_child.pack (desc))
+            level += 1
+        return 0, 0
+
+    def get (self, key, default = None):
+        """Entry by key
+        """
+        if not self.root:
+            return default
+        page_load = self.page_load
+        page = page_load (self.root)
+        while page.level:
+            page = page_load (page.children [max (bisect.bisect (page.keys, key) - 1, 0)])
+        keys = page.keys
+        index = bisect.bisect_left (keys, key)
+        if index == len (keys) or keys [index] != key:
+            return default
+        return page.Value (index)
+
+    def __getitem__ (self, key):
+        """Iterate over (key, entry) pairs of keys slice
+        """
+        if not isinstance (key, slice):
+            raise TypeError ('Only slices are supported')
+        return self.items (key.start, key.stop)
+
+    def items (self, start, stop):
+        if not self.root:
+            return
+
+        # find first leaf (path holds inner pages with index of current child)
+        path, page = [], self.page_load (self.root)
+        while page.level:
+            index = 0 if start is None else max (page.Bisect (start) - 1, 0)
+            path.append ((page, index))
+            page = self.page_load (page.Value (index))
+        index = 0 if start is None else page.BisectLeft (start)
+
+        while True:
+            for index in range (index, len (page)):
+                key = page.Key (index)
+                if stop is not None and key >= stop:
+                    return
+                yield key, page.Value (index)
+
+            # next leaf is the first leaf of the next child of the nearest parent
+            while path:
+                parent, child = path.pop ()
+                if child + 1 < len (parent):
+                    path.append ((parent, child + 1))
+                    page = self.page_load (parent.Value (child + 1))
+                    break
+            else:
+                return
+            while page.level:
+                path.append ((page, 0))
+                page = self.page_load (page.Value (0))
+            index = 0
+
+    def page_load (self, desc):
+        """Load page by it's descriptor
+        """
+        page = self.pages_inner.get (desc)
+        if page is None:
+            page = self.pages.Get (desc)
+            if page is None:
+                data = zlib.decompress (self.page_read (desc))
+                page = DictionaryTreePage (data, self.entry)
+                if page.level:
+                    self.pages_inner [desc] = page
+                else:
+                    self.pages.Set (desc, page, len (data))
+        return page
+
+    @classmethod
+    def page_encode (cls, level, entries):
+        """Encode page (header, end offsets of keys, keys and values)
+        """
+        ends, end = [], 0
+        for key, _ in entries:
+            end += len (key)
+            ends.append (end)
+        return b''.join ([cls.page_header.pack (level, len (entries)), struct.pack ('>{}H'.format (len (ends)), *ends)] +
+            [key for key, _ in entries] + [value for _, value in entries])
+
+class DictionaryTreePage (object):
+    """Page of static tree
+
+    Keys are sliced from decompressed page data when page is loaded, values
+    are unpacked on access (descriptors of children of inner pages are
+    unpacked when page is loaded).
+    """
+    __slots__ = ('level', 'keys', 'children', 'data', 'values_offset', 'value',)
+
+    def __init__ (self, data, entry):
+        self.level, count = DictionaryTree.page_header.unpack_from (data)
+        ends = struct.unpack_from ('>{}H'.format (count), data, DictionaryTree.page_header.size)
+        offset = DictionaryTree.page_header.size + 2 * count
+        self.keys = [data [offset + start:offset + end] for start, end in zip ((0,) + ends, ends)]
+        self.data = data
+        self.values_offset = offset + (ends [-1] if ends else 0)
+        self.value = entry
+        self.children = struct.unpack_from ('>{}Q'.format (count), data, self.values_offset) if self.level else None
+
+    def Key (self, index):
+        """Key by index
+        """
+        return self.keys [index]
+
+    def Value (self, index):
+        """Value by index (descriptor of child page for inner pages)
+        """
+        if self.children is not None:
+            return self.children [index]
+        return self.value.unpack_from (self.data, self.values_offset + index * self.value.size)
+
+    def Bisect (self, key):
+        """Index after the last key not greater than the key
+        """
+        return bisect.bisect (self.keys, key)
+
+    def BisectLeft (self, key):
+        """Index of the first key not less than the key
+        """
+        return bisect.bisect_left (self.keys, key)
+
+    def __len__ (self):
+        return len (self.keys)
+
 #------------------------------------------------------------------------------#
 # Card Range                                                                   #
 #------------------------------------------------------------------------------#
 class CardRange (object):
     """Card range
+
+    Range of cards with numbers from "number_start" up to (not including)
+    "number_stop", or up to the end of dictionary if it is None. Range is
+    empty if "number_start" is None.
     """
     __slots__ = ('dct', 'number_start', 'number_stop')
 
@@ -267,25 +1454,52 @@ class CardRange (object):
     def __iter__ (self):
         """Iterator interface
         """
-        if not self.number_start:
+        if self.number_start is None:
             return
-        elif not self.number_stop:
+        elif self.number_stop is None:
             entries = self.dct.number_index.index [self.number_start:]
         else:
             entries = self.dct.number_index.index [self.number_start:self.number_stop]
 
         for number, entry in entries:
-            card = self.dct.card_load (entry [0])
-            yield card ['words'][entry [1]], card
+            yield self.dct.entry_load (entry)
+
+    def __reversed__ (self):
+        """Reversed iterator interface
+        """
+        start, stop = self.bounds ()
+        while stop > start:
+            stop -= 1
+            yield self.dct.number_index [stop]
 
     def __len__ (self):
         """Size interface
         """
-        if not self.number_stop:
-            return 0
-        elif not self.number_stop:
-            return self.dct.Size () - self.number_start
-        else:
-            return self.number_stop - self.number_start
+        start, stop = self.bounds ()
+        return stop - start
+
+    def __getitem__ (self, index):
+        """Card by index inside range or sub-range by slice
+        """
+        start, stop = self.bounds ()
+        if isinstance (index, slice):
+            index_start, index_stop, step = index.indices (stop - start)
+            if step != 1:
+                raise ValueError ('Card range slice step is not supported')
+            return CardRange (self.dct, start + index_start, start + max (index_start, index_stop))
+
+        if index < 0:
+            index += stop - start
+        if not 0 <= index < stop - start:
+            raise IndexError ('Card range index out of range')
+        return self.dct.number_index [start + index]
+
+    def bounds (self):
+        """Start and stop numbers
+        """
+        if self.number_start is None:
+            return 0, 0
+        return self.number_start, max (self.number_start,
+            self.dct.Size if self.number_stop is None else self.number_stop)
 
 # vim: nu ft=python columns=120 :
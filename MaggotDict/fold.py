@@ -0,0 +1,19 @@
+# -*- coding: utf-8 -*-
+import unicodedata
+
+__all__ = ('Fold',)
+#------------------------------------------------------------------------------#
+# Fold                                                                         #
+#------------------------------------------------------------------------------#
+fold_case = getattr (type (u''), 'casefold', None) or type (u'').lower
+
+def Fold (word):
+    """Fold case and diacritics of the word
+
+    Word is decomposed, combining marks are dropped and the rest is case
+    folded, so "Café", "cafe" and "CAFE" have the same folded form.
+    """
+    return fold_case (u''.join (char for char in unicodedata.normalize ('NFKD', word)
+        if not unicodedata.combining (char)))
+
+# vim: nu ft=python columns=120 :
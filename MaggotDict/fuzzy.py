@@ -0,0 +1,52 @@
+# -*- coding: utf-8 -*-
+
+__all__ = ('FuzzyVariants', 'FuzzyDistance',)
+#------------------------------------------------------------------------------#
+# Symmetric Delete                                                             #
+#------------------------------------------------------------------------------#
+# Two words are within edit distance "d" only if they share a variant produced
+# by deleting at most "d" characters from each of them. So variants of each
+# headword are indexed, and lookup probes index with variants of the query and
+# verifies found candidates with real edit distance. Only a prefix of the word
+# is used to produce variants, which bounds number of variants of long words.
+#------------------------------------------------------------------------------#
+def FuzzyVariants (word, distance, prefix = 7):
+    """Variants of the word prefix with at most "distance" deleted characters
+
+    Returns set of variants (including the prefix itself).
+    """
+    variants = {word [:prefix]}
+    edge = variants
+    for _ in range (distance):
+        edge = set (variant [:index] + variant [index + 1:]
+            for variant in edge if len (variant) > 1 for index in range (len (variant)))
+        edge.difference_update (variants)
+        variants.update (edge)
+    return variants
+
+def FuzzyDistance (source, target, limit):
+    """Edit distance between words (optimal string alignment)
+
+    Returns None if distance is greater than "limit".
+    """
+    if abs (len (source) - len (target)) > limit:
+        return None
+
+    # rows of the previous, current and next characters of the source
+    row_prev, row = None, list (range (len (target) + 1))
+    for i, source_char in enumerate (source, 1):
+        row_next = [i] + [0] * len (target)
+        for j, target_char in enumerate (target, 1):
+            cost = 0 if source_char == target_char else 1
+            value = min (row [j] + 1, row_next [j - 1] + 1, row [j - 1] + cost)
+            if (cost and row_prev is not None and j > 1 and
+                source_char == target [j - 2] and source [i - 2] == target_char):
+                value = min (value, row_prev [j - 2] + 1)
+            row_next [j] = value
+        if min (row_next) > limit:
+            return None
+        row_prev, row = row, row_next
+
+    return row [-1] if row [-1] <= limit else None
+
+# vim: nu ft=python columns=120 :
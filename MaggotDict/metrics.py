@@ -0,0 +1,156 @@
+# -*- coding: utf-8 -*-
+import sys
+import threading
+import collections
+from timeit import default_timer as timer
+
+try:
+    import resource
+except ImportError:
+    resource = None # peak memory is not available
+
+__all__ = ('Metrics',)
+#------------------------------------------------------------------------------#
+# Metrics                                                                      #
+#------------------------------------------------------------------------------#
+class Metrics (object):
+    """Process wide counters and timing spans grouped by scope
+
+    Metrics are disabled by default, disabled metrics record nothing and
+    their spans are a shared no-op context manager, so instrumented code only
+    pays for a call.
+    """
+    enabled = False
+    lock = threading.Lock ()
+    spans = collections.OrderedDict () # scope -> name -> (seconds, count)
+    counters = collections.OrderedDict () # scope -> name -> value
+
+    @classmethod
+    def Enable (cls, enabled = True):
+        """Enable (or disable) recording
+        """
+        cls.enabled = enabled
+
+    @classmethod
+    def Enabled (cls):
+        """Whether metrics are recorded
+        """
+        return cls.enabled
+
+    @classmethod
+    def Span (cls, scope, name):
+        """Timing span context manager
+        """
+        return MetricsSpan (scope, name) if cls.enabled else metrics_span_none
+
+    @classmethod
+    def Phases (cls, scope):
+        """Sequential timing spans
+
+        Returns function which ends current phase (if any) and starts phase
+        with the provided name, None only ends current phase.
+        """
+        return MetricsPhases (scope)
+
+    @classmethod
+    def Count (cls, scope, name, value = 1):
+        """Increment counter
+        """
+        if cls.enabled:
+            with cls.lock:
+                counters = cls.counters.get (scope)
+                if counters is None:
+                    counters = cls.counters.setdefault (scope, {})
+                counters [name] = counters.get (name, 0) + value
+
+    @classmethod
+    def Gauge (cls, scope, name, value):
+        """Set counter to value
+        """
+        if cls.enabled:
+            with cls.lock:
+                counters = cls.counters.get (scope)
+                if counters is None:
+                    counters = cls.counters.setdefault (scope, {})
+                counters [name] = value
+
+    @classmethod
+    def PeakMemory (cls):
+        """Peak resident set size of the process in bytes (None if not available)
+        """
+        if resource is None:
+            return None
+        rss = resource.getrusage (resource.RUSAGE_SELF).ru_maxrss
+        return rss if sys.platform == 'darwin' else rss << 10
+
+    @classmethod
+    def Report (cls):
+        """Recorded metrics
+
+        Returns list of (scope, spans, counters), where spans maps name to
+        (seconds, count) and counters maps name to value.
+        """
+        return [(scope, cls.spans.get (scope, {}), cls.counters.get (scope, {}))
+            for scope in collections.OrderedDict.fromkeys (list (cls.spans) + list (cls.counters))]
+
+    @classmethod
+    def Clear (cls):
+        """Remove recorded metrics
+        """
+        cls.spans.clear ()
+        cls.counters.clear ()
+
+class MetricsSpan (object):
+    """Timing span
+    """
+    __slots__ = ('scope', 'name', 'start',)
+
+    def __init__ (self, scope, name):
+        self.scope = scope
+        self.name = name
+        self.start = None
+
+    def __enter__ (self):
+        self.start = timer ()
+        return self
+
+    def __exit__ (self, et, eo, tb):
+        elapsed = timer () - self.start
+        with Metrics.lock:
+            spans = Metrics.spans.get (self.scope)
+            if spans is None:
+                spans = Metrics.spans.setdefault (self.scope, {})
+            seconds, count = spans.get (self.name, (0, 0))
+            spans [self.name] = seconds + elapsed, count + 1
+        return False
+
+class MetricsPhases (object):
+    """Sequential timing spans
+    """
+    __slots__ = ('scope', 'span',)
+
+    def __init__ (self, scope):
+        self.scope = scope
+        self.span = None
+
+    def __call__ (self, name):
+        if self.span is not None:
+            self.span.__exit__ (None, None, None)
+            self.span = None
+        if name is not None and Metrics.enabled:
+            self.span = MetricsSpan (self.scope, name).__enter__ ()
+
+class MetricsSpanNone (object):
+    """No-op timing span
+    """
+    __slots__ = ()
+
+    def __enter__ (self):
+        return self
+
+    def __exit__ (self, et, eo, tb):
+        return False
+
+metrics_span_none = MetricsSpanNone ()
+
+# vim: nu ft=python columns=120 :
@@ -0,0 +1,131 @@
+# -*- coding: utf-8 -*-
+import heapq
+import pickle
+import itertools
+import tempfile
+
+__all__ = ('ExternalSort',)
+#------------------------------------------------------------------------------#
+# External Sort                                                                #
+#------------------------------------------------------------------------------#
+class ExternalSort (object):
+    """Sort of items which do not fit into memory
+
+    Items are collected in memory until their approximate size reaches
+    "memory" bytes, then they are sorted and spilled to temporary file as a
+    run. Once there are "merge_max" runs of the same level they are merged
+    into a single run of the next level, so number of open temporary files
+    grows only logarithmically with number of items. Remaining runs are
+    merged when sorted items are requested (at most "merge_max" runs at once,
+    so memory used by merge does not depend on number of runs).
+    Items are tuples starting with a string, which is the only part accounted
+    in their size. If "memory" is None, all items are kept and sorted in
+    memory.
+    """
+    item_size = 128 # approximate size of item (without its string)
+    chunk_size = 256 # items pickled at once
+    merge_max = 64 # runs merged at once
+
+    def __init__ (self, memory = None):
+        self.memory = memory
+        self.items = []
+        self.items_size = 0
+        self.runs = []
+        self.count = 0
+
+    def Add (self, item):
+        """Add item
+        """
+        self.items.append (item)
+        self.count += 1
+        if self.memory is not None:
+            self.items_size += self.item_size + len (item [0])
+            if self.items_size >= self.memory:
+                self.spill ()
+
+    def Sorted (self):
+        """Iterate over sorted items
+
+        Items can only be iterated once.
+        """
+        if not self.runs:
+            items, self.items = self.items, []
+            items.sort ()
+            return iter (items)
+
+        self.spill ()
+        while len (self.runs) > self.merge_max:
+            runs, self.runs = self.runs [:self.merge_max], self.runs [self.merge_max:]
+            self.runs.append ((runs [-1][0] + 1, self.runs_merge (runs)))
+        return heapq.merge (*(self.run_items (run) for level, run in self.runs))
+
+    def __len__ (self):
+        return self.count
+
+    #--------------------------------------------------------------------------#
+    # Private                                                                  #
+    #--------------------------------------------------------------------------#
+    def spill (self):
+        """Spill collected items as sorted run
+        """
+        if not self.items:
+            return
+        self.items.sort ()
+        self.runs.append ((0, self.run_write (iter (self.items))))
+        self.items, self.items_size = [], 0
+
+        # runs are ordered by non-increasing level, so the last "merge_max" runs
+        # are of the same level if the first and the last of them are
+        while len (self.runs) >= self.merge_max and self.runs [-self.merge_max][0] == self.runs [-1][0]:
+            runs, self.runs = self.runs [-self.merge_max:], self.runs [:-self.merge_max]
+            self.runs.append ((runs [-1][0] + 1, self.runs_merge (runs)))
+
+    def runs_merge (self, runs):
+        """Merge (level, run) pairs into a single run
+        """
+        return self.run_write (heapq.merge (*(self.run_items (run) for level, run in runs)))
+
+    def run_write (self, items):
+        """Write sorted items to temporary file
+        """
+        run = tempfile.TemporaryFile ()
+        while True:
+            chunk = list (itertools.islice (items, self.chunk_size))
+            if not chunk:
+                break
+            pickle.dump (chunk, run, pickle.HIGHEST_PROTOCOL)
+        run.seek (0)
+        return run
+
+    def run_items (self, run):
+        """Iterate over items of the run
+        """
+        try:
+            while True:
+                try:
+                    items = pickle.load (run)
+                except EOFError:
+                    break
+                for item in items:
+                    yield item
+        finally:
+            run.close ()
+
+    #--------------------------------------------------------------------------#
+    # Dispose                                                                  #
+    #--------------------------------------------------------------------------#
+    def Dispose (self):
+        """Remove spilled runs
+        """
+        for level, run in self.runs:
+            run.close ()
+        self.runs, self.items = [], []
+
+    def __enter__ (self):
+        return self
+
+    def __exit__ (self, et, eo, tb):
+        self.Dispose ()
+        return False
+
+# vim: nu ft=python columns=120 :
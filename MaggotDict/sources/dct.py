@@ -1,7 +1,9 @@
 # -*- coding: utf-8 -*-
 import io
 import os
+import mmap
 import struct
+from .dictzip import DictZip
 from ..pretzel.log import Log
 
 __all__ = ('DICTSource',)
@@ -12,12 +14,18 @@ class DICTSource (object):
     """DICT dictionary source
     """
     buffer_size = 1 << 16
+    desc_struct = struct.Struct ('>2I')
 
     def __init__ (self, datafile, indexfile):
-        self.name = os.path.basename (datafile).rpartition ('.') [0]
+        self.name = os.path.basename (datafile)
+        self.compressed = self.name.lower ().endswith ('.dz')
+        self.name = self.name [:-len ('.dict.dz' if self.compressed else '.dict')]
 
+        self.datafile = datafile
+        self.indexfile = indexfile
         self.indexstream = io.open (indexfile, 'rb', buffering = self.buffer_size)
         self.datastream = io.open (datafile, 'rb')
+        self.views = None
 
     #--------------------------------------------------------------------------#
     # Validate                                                                 #
@@ -26,21 +34,24 @@ class DICTSource (object):
     def FromFile (cls, filename):
         """Create source from file if possible
         """
-        fileprefix = filename.rpartition ('.') [0]
         filepath = os.path.dirname (filename)
+        filename_lower = filename.lower ()
 
-        if filename.lower ().endswith ('.dict'):
+        if filename_lower.endswith (('.dict', '.dict.dz')):
+            fileprefix = os.path.basename (filename [:filename_lower.rindex ('.dict')])
             indexfile = (fileprefix + '.idx').lower ()
             for file in os.listdir (filepath or '.'):
                 if file.lower () == indexfile:
-                    return cls (filename, file)
+                    return cls (filename, os.path.join (filepath, file))
             Log.Warning ('matching index file was not found: {}'.format (filename))
 
-        elif filename.endswith ('.idx'):
-            datafile = (fileprefix + '.dict').lower ()
-            for file in os.listdir (filepath or '.'):
-                if file.lower () == datafile:
-                    return cls (file, filename)
+        elif filename_lower.endswith ('.idx'):
+            fileprefix = os.path.basename (filename [:-len ('.idx')])
+            datafiles = [(fileprefix + ext).lower () for ext in ('.dict', '.dict.dz')]
+            files = dict ((file.lower (), file) for file in os.listdir (filepath or '.'))
+            for datafile in datafiles:
+                if datafile in files:
+                    return cls (os.path.join (filepath, files [datafile]), filename)
             Log.Warning ('matching data file was not found: {}'.format (filename))
 
     #--------------------------------------------------------------------------#
@@ -61,65 +72,133 @@ class DICTSource (object):
     #--------------------------------------------------------------------------#
     # Cards                                                                    #
     #--------------------------------------------------------------------------#
-    def Cards (self, report = None):
+    def Cards (self, report = None, jobs = None):
         """Iterate over available cards
+
+        Index and data files are memory mapped and entries are parsed in
+        place. Cards are yielded in index order while offsets of their bodies
+        increase (which is the case for most dictionaries), the rest of the
+        entries is read in order of offsets, so data file is read with at most
+        two sequential passes. Compressed (dictzip) data file is not mapped,
+        only chunks covering entries are decompressed. "jobs" is accepted for
+        compatibility with other sources and ignored.
         """
-        desc_struct = struct.Struct ('>2I')
-        data = b''
         report = report or (lambda _: None)
 
-        self.indexstream.seek (0, io.SEEK_END)
-        index_size = self.indexstream.tell ()
-        self.indexstream.seek (0)
-
-        while True:
-            report (self.indexstream.tell () / index_size)
+        index = self.map (self.indexstream)
+        data = DictZip (self.datastream) if self.compressed else self.map (self.datastream)
+        try:
+            index_find, index_size = index.find, float (len (index)) or 1.
+            desc_unpack, desc_size = self.desc_struct.unpack_from, self.desc_struct.size
 
-            # read chunk
-            chunk = self.indexstream.read (self.buffer_size)
-            if not chunk:
-                break
-            data += chunk
+            def card (start, end, offset, size):
+                return dict_card (index [start:end], data [offset:offset + size])
 
-            # parse
-            start = 0
+            # entries in order of offsets
+            entries, offset_prev, start, count = None, 0, 0, 0
             while True:
-
-                end = data.find (b'\x00', start)
-                if end < 0:
+                end = index_find (b'\x00', start)
+                if end < 0 or end + desc_size >= len (index):
                     break
-                word = data [start:end].decode ('utf-8')
-                new_start = end + desc_struct.size + 1
-                if new_start > len (data):
+                offset, size = desc_unpack (index, end + 1)
+
+                if entries is None and offset >= offset_prev:
+                    offset_prev = offset
+                    yield card (start, end, offset, size)
+                else:
+                    if entries is None:
+                        entries = []
+                    entries.append ((offset, start))
+                start = end + desc_size + 1
+
+                count += 1
+                if not count & 0xfff:
+                    report (start / index_size)
+
+            # entries out of order
+            if entries:
+                entries.sort ()
+                for offset, start in entries:
+                    end = index_find (b'\x00', start)
+                    yield card (start, end, *desc_unpack (index, end + 1))
+
+        finally:
+            for view in (index, data):
+                if isinstance (view, mmap.mmap):
+                    view.close ()
+
+        report (1.)
+
+    #--------------------------------------------------------------------------#
+    # Entries                                                                  #
+    #--------------------------------------------------------------------------#
+    def Entries (self, report = None):
+        """Iterate over (word, position) pairs in index order
+
+        Position is offset of the entry inside index file, card of the entry
+        can be loaded later with "CardAt". Data file is not read.
+        """
+        report = report or (lambda _: None)
+
+        index = self.map (self.indexstream)
+        try:
+            index_find, index_size = index.find, float (len (index)) or 1.
+            desc_size = self.desc_struct.size
+
+            start, count = 0, 0
+            while True:
+                end = index_find (b'\x00', start)
+                if end < 0 or end + desc_size >= len (index):
                     break
-                start = new_start
-                offset, size = desc_struct.unpack (data [end + 1:start])
-
-                self.datastream.seek (offset)
-                body = self.datastream.read (size).decode ('utf-8')
-
-                yield {
-                    'words': [word],
-                    'body' : {
-                        'name': 'root',
-                        'children': [{
-                            'name' : 'text',
-                            'value': body.rstrip ('\n').rstrip ('\r')
-                        }]
-                    }
-                }
-
-            # copy tail
-            data = data [start:]
+                yield index [start:end].decode ('utf-8'), start
+                start = end + desc_size + 1
+
+                count += 1
+                if not count & 0xfff:
+                    report (start / index_size)
+
+        finally:
+            if isinstance (index, mmap.mmap):
+                index.close ()
 
         report (1.)
 
+    def CardAt (self, position):
+        """Card of the entry at position inside index file (see "Entries")
+
+        Returns card and size of its data. Files are mapped on first call and
+        stay mapped until source is disposed.
+        """
+        if self.views is None:
+            self.views = (self.map (self.indexstream),
+                DictZip (self.datastream) if self.compressed else self.map (self.datastream))
+        index, data = self.views
+
+        end = index.find (b'\x00', position)
+        if end < 0:
+            raise ValueError ('Invalid entry position: {}'.format (position))
+        offset, size = self.desc_struct.unpack_from (index, end + 1)
+        return dict_card (index [position:end], data [offset:offset + size]), size
+
+    def map (self, stream):
+        """Memory map whole stream (empty stream cannot be mapped)
+        """
+        stream.seek (0, io.SEEK_END)
+        if not stream.tell ():
+            return b''
+        return mmap.mmap (stream.fileno (), 0, access = mmap.ACCESS_READ)
+
     #--------------------------------------------------------------------------#
     # Dispose                                                                  #
     #--------------------------------------------------------------------------#
     def Dispose (self):
         """Dispose object
         """
+        if self.views is not None:
+            for view in self.views:
+                if isinstance (view, mmap.mmap):
+                    view.close ()
+            self.views = None
         self.indexstream.close ()
         self.datastream.close ()
 
@@ -130,4 +209,18 @@ class DICTSource (object):
         self.Dispose ()
         return False
 
+def dict_card (word, data):
+    """Create card from utf-8 encoded word and body
+    """
+    return {
+        'words': [word.decode ('utf-8')],
+        'body' : {
+            'name': 'root',
+            'children': [{
+                'name' : 'text',
+                'value': data.decode ('utf-8').rstrip ('\n').rstrip ('\r')
+            }]
+        }
+    }
+
 # vim: nu ft=python columns=120 :
@@ -0,0 +1,116 @@
+# -*- coding: utf-8 -*-
+import io
+import zlib
+import struct
+
+from ..cache import Cache
+
+__all__ = ('DictZip', 'DictZipError',)
+#------------------------------------------------------------------------------#
+# DictZip                                                                      #
+#------------------------------------------------------------------------------#
+# Dictzip is a gzip file compressed in chunks of fixed uncompressed size (each
+# chunk ends with full flush, so it can be inflated independently). Compressed
+# sizes of chunks are stored in "RA" subfield of gzip extra field:
+#
+#   version (u16 le), chunk length (u16 le), chunks count (u16 le),
+#   compressed size of each chunk (u16 le)
+#------------------------------------------------------------------------------#
+class DictZipError (Exception):
+    """Dictzip format error
+    """
+    pass
+
+class DictZip (object):
+    """Random access reader of dictzip file
+
+    Only chunks covering requested range are decompressed, decompressed
+    chunks are kept in cache bounded by "cache_size" bytes.
+    """
+    cache_size_default = 1 << 22
+
+    flag_hcrc    = 0x02
+    flag_extra   = 0x04
+    flag_name    = 0x08
+    flag_comment = 0x10
+
+    def __init__ (self, stream, cache_size = None):
+        self.stream = stream
+        self.chunks = Cache (self.cache_size_default if cache_size is None else cache_size)
+
+        stream.seek (0)
+        magic, method, flags = struct.unpack ('<HBB6x', stream.read (10))
+        if magic != 0x8b1f or method != 8:
+            raise DictZipError ('Not a gzip file')
+        if not flags & self.flag_extra:
+            raise DictZipError ('Gzip file has no chunks table (not a dictzip)')
+
+        # chunks table
+        extra = stream.read (struct.unpack ('<H', stream.read (2)) [0])
+        extra_offset, chunks_sizes = 0, None
+        while extra_offset + 4 <= len (extra):
+            field_id, field_size = struct.unpack_from ('<2sH', extra, extra_offset)
+            extra_offset += 4
+            if field_id == b'RA':
+                version, self.chunk_size, chunks_count = struct.unpack_from ('<3H', extra, extra_offset)
+                if version != 1:
+                    raise DictZipError ('Unsupported dictzip version: {}'.format (version))
+                chunks_sizes = struct.unpack_from ('<{}H'.format (chunks_count), extra, extra_offset + 6)
+            extra_offset += field_size
+        if chunks_sizes is None:
+            raise DictZipError ('Gzip file has no chunks table (not a dictzip)')
+
+        # skip name, comment and header crc
+        for flag in (self.flag_name, self.flag_comment):
+            if flags & flag:
+                while stream.read (1) not in (b'\x00', b''):
+                    pass
+        if flags & self.flag_hcrc:
+            stream.read (2)
+
+        # chunks offsets
+        offset = stream.tell ()
+        self.chunks_offset = []
+        for size in chunks_sizes:
+            self.chunks_offset.append (offset)
+            offset += size
+        self.chunks_offset.append (offset)
+
+    #--------------------------------------------------------------------------#
+    # Read                                                                     #
+    #--------------------------------------------------------------------------#
+    def Read (self, offset, size):
+        """Read uncompressed data
+        """
+        if size <= 0:
+            return b''
+        chunk_first, chunk_offset = divmod (offset, self.chunk_size)
+        chunk_last = (offset + size - 1) // self.chunk_size
+        data = b''.join (self.chunk_load (chunk) for chunk in range (chunk_first, chunk_last + 1))
+        return data [chunk_offset:chunk_offset + size]
+
+    def __getitem__ (self, key):
+        """Read uncompressed data by slice
+        """
+        if not isinstance (key, slice) or key.step is not None or key.start is None or key.stop is None:
+            raise TypeError ('Only bounded slices are supported')
+        return self.Read (key.start, key.stop - key.start)
+
+    #--------------------------------------------------------------------------#
+    # Private                                                                  #
+    #--------------------------------------------------------------------------#
+    def chunk_load (self, chunk):
+        """Load decompressed chunk
+        """
+        data = self.chunks.Get (chunk)
+        if data is None:
+            if not 0 <= chunk < len (self.chunks_offset) - 1:
+                return b''
+            offset = self.chunks_offset [chunk]
+            self.stream.seek (offset)
+            data = zlib.decompressobj (-zlib.MAX_WBITS).decompress (
+                self.stream.read (self.chunks_offset [chunk + 1] - offset))
+            self.chunks.Set (chunk, data, len (data))
+        return data
+
+# vim: nu ft=python columns=120 :
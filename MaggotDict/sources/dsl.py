@@ -4,7 +4,10 @@ import io
 import re
 import array
 import codecs
+import hashlib
 import itertools
+import collections
+import multiprocessing
 
 __all__ = ('DSLSource',)
 #------------------------------------------------------------------------------#
@@ -102,9 +105,262 @@ class DSLSource (object):
         't'  : 'transcript',
         'trn': 'translation',
     }
+    jobs_chunk_size = 256 # entries sent to worker process at once
+    jobs_chunks_max = 4 # chunks in flight per worker process
+    fingerprint_version = 1 # changes whenever cards of the same entries change
 
-    def Cards (self, report = None):
+    def Cards (self, report = None, jobs = None):
         """Iterate over available cards
+
+        If "jobs" is greater than one, cards are parsed by a pool of worker
+        processes. Cards are yielded in source order in either case.
+        """
+        entries = self.entries (report)
+        if not jobs or jobs <= 1:
+            for head, body in entries:
+                yield self.card_parse (head, body)
+            return
+
+        pool = multiprocessing.Pool (jobs)
+        try:
+            for card in self.jobs_map (pool, jobs, card_parse, entries):
+                yield card
+            pool.close ()
+        finally:
+            pool.terminate ()
+            pool.join ()
+
+    def Fingerprinted (self, report = None, jobs = None, known = None):
+        """Iterate over (fingerprint, card) pairs
+
+        Fingerprint is a digest of the raw entry of the card. If "known" is
+        provided, it is called with fingerprint of each entry and entries it
+        returns true for are not parsed (card is None). Pairs are yielded in
+        source order, "known" is always called on the calling thread.
+        """
+        known = known or (lambda _: False)
+        def entries ():
+            for head, body in self.entries (report):
+                fingerprint = hashlib.sha1 ('\n'.join (head + body).encode ('utf-8')).digest ()
+                if known (fingerprint):
+                    yield fingerprint, None, None
+                else:
+                    yield fingerprint, head, body
+
+        if not jobs or jobs <= 1:
+            for fingerprint, head, body in entries ():
+                yield fingerprint, None if head is None else self.card_parse (head, body)
+            return
+
+        pool = multiprocessing.Pool (jobs)
+        try:
+            for pair in self.jobs_map (pool, jobs, card_parse_fingerprinted, entries ()):
+                yield pair
+            pool.close ()
+        finally:
+            pool.terminate ()
+            pool.join ()
+
+    def jobs_map (self, pool, jobs, func, items):
+        """Map function over items by pool of processes
+
+        Items are read on the calling thread in chunks of "jobs_chunk_size",
+        and at most "jobs_chunks_max" chunks per process are in flight, so
+        source is not read ahead of parsed cards. Results are yielded in
+        order of items.
+        """
+        items, chunks = iter (items), collections.deque ()
+        while True:
+            chunk = list (itertools.islice (items, self.jobs_chunk_size))
+            if chunk:
+                chunks.append (pool.apply_async (chunk_map, (func, chunk)))
+            elif not chunks:
+                return
+            if not chunk or len (chunks) >= jobs * self.jobs_chunks_max:
+                for result in chunks.popleft ().get ():
+                    yield result
+
+    @classmethod
+    def card_parse (cls, head, body):
+        """Parse card from its head and body lines
+        """
+        #----------------------------------------------------------------------#
+        # Head                                                                 #
+        #----------------------------------------------------------------------#
+        words = []
+        for word in head:
+            word = cls.word_space_regex.sub (' ', cls.word_ignore_regex.sub ('', word))
+            word_alts    = cls.word_alt_regex.findall (word)
+            word_pattern = cls.word_alt_regex.sub ('{}', word)
+            if word_alts:
+                word_alts.insert (0, '')
+                words.extend ((word_pattern.format (*(word_alts [(i + 1) * y] for i, y in enumerate (m))))
+                        for m in itertools.product ((0, 1), repeat = len (word_alts) - 1))
+            else:
+                words.append (word)
+
+        #----------------------------------------------------------------------#
+        # Body                                                                 #
+        #----------------------------------------------------------------------#
+        lines, body = body, []
+        for line in lines:
+            line = line.strip ()
+            if line:
+                if line.startswith ('[m'):
+                    body.append (line)
+                else:
+                    body.append ('[m0]')
+                    body.append (line)
+                    body.append ('[/m]')
+        body = ''.join (body)
+
+        # parse
+        def node_create (name, value = None, children = None):
+            node = {'name': name}
+            if name != 'text':
+                node ['children'] = []
+            if value is not None:
+                node ['value'] = value
+            return node
+
+        offset, stack, match = 0, [node_create ('root')], None
+        for match in cls.tag_regex.finditer (body):
+            close, name, value = match.groups ()
+
+            # transform
+            if name.startswith ('m'):
+                value = int (name [1:]) if len (name) > 1 else 0
+                name  = 'indent'
+            else:
+                value = value and value.strip ()
+                name  = cls.tag_map.get (name, name)
+            node = stack [-1]
+
+            # text
+            if offset < match.start ():
+                node ['children'].append (node_create ('text',
+                    cls.text_escape_regex.sub (r'\1', body [offset:match.start ()])))
+            offset = match.end ()
+
+            # node
+            if close:
+                node = stack.pop ()
+
+                # order
+                if not node ['name'].startswith (name):
+                    # restore
+                    stack.append (node)
+                    # find match
+                    shift = [(name, value)]
+                    for index, node in enumerate (reversed (stack)):
+                        if node ['name'].startswith (name):
+                            # shift nodes
+                            for node in stack [- index - 1:]:
+                                name, value = shift.pop ()
+
+                                node ['name'] = name
+                                if value is not None:
+                                    node ['value'] = value
+                            break
+                        else:
+                            shift.append ((node ['name'], node.get ('value')))
+                    # unwind stack
+                    node = stack.pop ()
+
+                # transcription
+                if name == 'transcript':
+                    children = node ['children']
+                    if len (children) == 1 and children [0]['name'] == 'text':
+                        codes = array.array ('H', children [0]['value'].encode ('utf-16le'))
+
+                        node.pop ('children')
+                        node ['value'] = ''.join (transcript_map.get (code, '?') for code in codes)
+
+                # sound
+                if name == 'sound':
+                    children = node.pop ('children')
+                    if len (children) == 1 and children [0]['name'] == 'text':
+                        node ['value'] = children [0]['value']
+                    else:
+                        node ['children'] = children
+
+            else:
+                child = node_create (name, value)
+                node ['children'].append (child)
+                stack.append (child)
+        # tail
+        if match:
+            if match.end () < len (body):
+                stack [-1]['children'].append (node_create ('text',
+                    cls.text_escape_regex.sub (r'\1', body [match.end ():])))
+        else:
+            stack [-1]['children'].append (node_create ('text',
+                cls.text_escape_regex.sub (r'\1', body)))
+
+        root = stack [-1]
+        del stack [:]
+
+        # swap 'folds' with 'indents' and merge white spaces
+        def walk_hoist (node):
+            if node ['name'] == 'fold':
+                parent = stack [-1]
+
+                # swap
+                if parent ['name'] == 'indent' and len (parent ['children']) == 1:
+                    node ['name'],  parent ['name']  = parent ['name'],  node ['name']
+                    node ['value'] = parent.pop ('value')
+
+                    node   = parent
+                    parent = stack [-2]
+
+                # merge spaces
+                parent_children = parent ['children']
+                index = parent_children.index (node) + 1
+                if index < len (parent_children):
+                    node_left = parent_children [index]
+                    if node_left ['name'] == 'text' and not len (node_left ['value'].strip ()):
+                        parent_children.pop (index)
+                        node ['children'].append (node_left)
+
+                return
+
+            stack.append (node)
+            for child in node ['children']:
+                if 'children' in child:
+                    walk_hoist (child)
+            stack.pop ()
+        walk_hoist (root)
+
+        # merge adjoining folds
+        get_is_fold = lambda node: node ['name'] == 'fold'
+        def walk_join (node):
+            children = []
+            for is_fold, group in itertools.groupby (node ['children'], get_is_fold):
+                if is_fold:
+                    fold = node_create ('fold')
+                    for child in group:
+                        fold ['children'].extend (child ['children'])
+                    children.append (fold)
+                else:
+                    for child in group:
+                        children.append (child)
+                        if 'children' in child:
+                            walk_join (child)
+            node ['children'] = children
+        walk_join (root)
+
+        return {
+            'words': words,
+            'body': root
+        }
+
+    #--------------------------------------------------------------------------#
+    # Private                                                                  #
+    #--------------------------------------------------------------------------#
+    def entries (self, report = None):
+        """Iterate over raw card entries
+
+        Entry is a pair of head lines and body lines of the card.
         """
         lines = self.lines (self.offset)
         if report:
@@ -120,9 +376,7 @@ class DSLSource (object):
         try:
             line, offset, size = next (lines)
             while True:
-                #--------------------------------------------------------------#
-                # Head                                                         #
-                #--------------------------------------------------------------#
+                # head
                 head = []
                 while self.word_regex.match (line):
                     head.append (line)
@@ -131,190 +385,20 @@ class DSLSource (object):
                 if not head:
                     break
 
-                # parse
-                words = []
-                for word in head:
-                    word = self.word_space_regex.sub (' ', self.word_ignore_regex.sub ('', word))
-                    word_alts    = self.word_alt_regex.findall (word)
-                    word_pattern = self.word_alt_regex.sub ('{}', word)
-                    if word_alts:
-                        word_alts.insert (0, '')
-                        words.extend ((word_pattern.format (*(word_alts [(i + 1) * y] for i, y in enumerate (m))))
-                                for m in itertools.product ((0, 1), repeat = len (word_alts) - 1))
-                    else:
-                        words.append (word)
-
-                #--------------------------------------------------------------#
-                # Body                                                         #
-                #--------------------------------------------------------------#
+                # body
                 body = []
                 try:
                     while not self.word_regex.match (line):
-                        line = line.strip ()
-                        if line:
-                            if line.startswith ('[m'):
-                                body.append (line)
-                            else:
-                                body.append ('[m0]')
-                                body.append (line)
-                                body.append ('[/m]')
-
+                        body.append (line)
                         line, stream_offset, size = next (lines)
                     report_changed (stream_offset / self.stream_size)
                 except StopIteration:
-                    report (1)
-
-                body = ''.join (body)
-
-                # parse
-                def node_create (name, value = None, children = None):
-                    node = {'name': name}
-                    if name != 'text':
-                        node ['children'] = []
-                    if value is not None:
-                        node ['value'] = value
-                    return node
-
-                offset, stack, match = 0, [node_create ('root')], None
-                for match in self.tag_regex.finditer (body):
-                    close, name, value = match.groups ()
-
-                    # transform
-                    if name.startswith ('m'):
-                        value = int (name [1:]) if len (name) > 1 else 0
-                        name  = 'indent'
-                    else:
-                        value = value and value.strip ()
-                        name  = self.tag_map.get (name, name)
-                    node = stack [-1]
-
-                    # text
-                    if offset < match.start ():
-                        node ['children'].append (node_create ('text',
-                            self.text_escape_regex.sub (r'\1', body [offset:match.start ()])))
-                    offset = match.end ()
-
-                    # node
-                    if close:
-                        node = stack.pop ()
-
-                        # order
-                        if not node ['name'].startswith (name):
-                            # restore
-                            stack.append (node)
-                            # find match
-                            shift = [(name, value)]
-                            for index, node in enumerate (reversed (stack)):
-                                if node ['name'].startswith (name):
-                                    # shift nodes
-                                    for node in stack [- index - 1:]:
-                                        name, value = shift.pop ()
-
-                                        node ['name'] = name
-                                        if value is not None:
-                                            node ['value'] = value
-                                    break
-                                else:
-                                    shift.append ((node ['name'], node.get ('value')))
-                            # unwind stack
-                            node = stack.pop ()
-
-                        # transcription
-                        if name == 'transcript':
-                            children = node ['children']
-                            if len (children) == 1 and children [0]['name'] == 'text':
-                                codes = array.array ('H')
-                                codes.fromstring (children [0]['value'].encode ('utf-16le'))
-
-                                node.pop ('children')
-                                node ['value'] = ''.join (transcript_map.get (code, '?') for code in codes)
-
-                        # sound
-                        if name == 'sound':
-                            children = node.pop ('children')
-                            if len (children) == 1 and children [0]['name'] == 'text':
-                                node ['value'] = children [0]['value']
-                            else:
-                                node ['children'] = children
-
-                    else:
-                        child = node_create (name, value)
-                        node ['children'].append (child)
-                        stack.append (child)
-                # tail
-                if match:
-                    if match.end () < len (body):
-                        stack [-1]['children'].append (node_create ('text',
-                            self.text_escape_regex.sub (r'\1', body [match.end ():])))
-                else:
-                    stack [-1]['children'].append (node_create ('text',
-                        self.text_escape_regex.sub (r'\1', body)))
+                    report_changed (1)
 
-                root = stack [-1]
-                del stack [:]
-
-                # swap 'folds' with 'indents' and merge white spaces
-                def walk_hoist (node):
-                    if node ['name'] == 'fold':
-                        parent = stack [-1]
-
-                        # swap
-                        if parent ['name'] == 'indent' and len (parent ['children']) == 1:
-                            node ['name'],  parent ['name']  = parent ['name'],  node ['name']
-                            node ['value'] = parent.pop ('value')
-
-                            node   = parent
-                            parent = stack [-2]
-
-                        # merge spaces
-                        parent_children = parent ['children']
-                        index = parent_children.index (node) + 1
-                        if index < len (parent_children):
-                            node_left = parent_children [index]
-                            if node_left ['name'] == 'text' and not len (node_left ['value'].strip ()):
-                                parent_children.pop (index)
-                                node ['children'].append (node_left)
-
-                        return
-
-                    stack.append (node)
-                    for child in node ['children']:
-                        if 'children' in child:
-                            walk_hoist (child)
-                    stack.pop ()
-                walk_hoist (root)
-
-                # merge adjoining folds
-                get_is_fold = lambda node: node ['name'] == 'fold'
-                def walk_join (node):
-                    children = []
-                    for is_fold, group in itertools.groupby (node ['children'], get_is_fold):
-                        if is_fold:
-                            fold = node_create ('fold')
-                            for child in group:
-                                fold ['children'].extend (child ['children'])
-                            children.append (fold)
-                        else:
-                            for child in group:
-                                children.append (child)
-                                if 'children' in child:
-                                    walk_join (child)
-                    node ['children'] = children
-                walk_join (root)
-
-                #--------------------------------------------------------------#
-                # Yield                                                        #
-                #--------------------------------------------------------------#
-                yield {
-                    'words': words,
-                    'body': root
-                }
+                yield head, body
 
         except StopIteration: pass
 
-    #--------------------------------------------------------------------------#
-    # Private                                                                  #
-    #--------------------------------------------------------------------------#
     def lines (self, offset):
         """Lines starting from "offset"
         """
@@ -350,6 +434,25 @@ class DSLSource (object):
         self.Dispose ()
         return False
 
+#------------------------------------------------------------------------------#
+# Worker                                                                       #
+#------------------------------------------------------------------------------#
+def chunk_map (func, chunk):
+    """Map function over chunk of items inside worker process
+    """
+    return [func (item) for item in chunk]
+
+def card_parse (entry):
+    """Parse raw card entry inside worker process
+    """
+    return DSLSource.card_parse (*entry)
+
+def card_parse_fingerprinted (entry):
+    """Parse fingerprinted raw card entry inside worker process
+    """
+    fingerprint, head, body = entry
+    return fingerprint, None if head is None else DSLSource.card_parse (head, body)
+
 transcript_map = {code: value.decode ('utf-8') for code, value in {
     0x0020: b" ",                        # space
     0x0027: b'\'',                       # '
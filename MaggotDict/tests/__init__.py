@@ -0,0 +1,19 @@
+# -*- coding: utf-8 -*-
+
+__all__ = []
+#------------------------------------------------------------------------------#
+# Load Test Protocol                                                           #
+#------------------------------------------------------------------------------#
+def load_tests (loader, tests, pattern):
+    """Load test protocol
+    """
+    from unittest import TestSuite
+    from . import app, cache, card, dictionary, dictzip, fold, fuzzy, sort, text
+
+    suite = TestSuite ()
+    for test in (app, cache, card, dictionary, dictzip, fold, fuzzy, sort, text):
+        suite.addTests (loader.loadTestsFromModule (test))
+
+    return suite
+
+# vim: nu ft=python columns=120 :
@@ -0,0 +1,158 @@
+# -*- coding: utf-8 -*-
+import io
+import os
+import shutil
+import unittest
+import tempfile
+
+from ..apps.app import DictApp, Completion
+from ..dictionary import Dictionary
+from ..fold import Fold
+from ..pretzel.store import FileStore
+from .corpus import CorpusCards, CorpusDSL, CorpusDICT
+
+__all__ = ('CompletionTest', 'DictAppTest',)
+#------------------------------------------------------------------------------#
+# Completion                                                                   #
+#------------------------------------------------------------------------------#
+class CompletionTest (unittest.TestCase):
+    """Completion index unit tests
+    """
+    def setUp (self):
+        self.path = tempfile.mkdtemp ()
+        self.cards = CorpusCards (300)
+        self.dcts = {}
+        for name, cards in (('first', self.cards [:200]), ('second', self.cards [100:])):
+            src = CorpusDSL (os.path.join (self.path, name + '.dsl'), cards, name)
+            self.dcts [name] = Dictionary.Compile (src, os.path.join (self.path, name + '.mdict'))
+        self.store = FileStore (os.path.join (self.path, 'state.store'), 'c')
+
+    def tearDown (self):
+        self.store.Dispose ()
+        for dct in self.dcts.values ():
+            dct.Dispose ()
+        shutil.rmtree (self.path)
+
+    def testAddRemove (self):
+        """Words of added dictionaries are completed until they are removed
+        """
+        comp, first, second = Completion (self.store), self.dcts ['first'], self.dcts ['second']
+        self.assertEqual (self.complete (comp, u''), [])
+
+        comp.Add (first)
+        self.assertEqual (self.complete (comp, u''), self.words (self.cards [:200]))
+        comp.Add (first) # added once
+        comp.Remove (second) # not added
+        self.assertEqual (self.complete (comp, u''), self.words (self.cards [:200]))
+
+        # words of both dictionaries are kept until both are removed
+        comp.Add (second)
+        self.assertEqual (self.complete (comp, u''), self.words (self.cards))
+        comp.Remove (first)
+        self.assertEqual (self.complete (comp, u''), self.words (self.cards [100:]))
+        comp.Remove (second)
+        self.assertEqual (self.complete (comp, u''), [])
+
+    def testSync (self):
+        """Index is synchronized with enabled dictionaries
+        """
+        comp, first, second = Completion (self.store), self.dcts ['first'], self.dcts ['second']
+        comp.Sync ([first, second], {})
+        self.assertEqual (self.complete (comp, u''), self.words (self.cards))
+        comp.Sync ([second], {'first': first})
+        self.assertEqual (self.complete (comp, u''), self.words (self.cards [100:]))
+
+        # index is rebuilt if removed dictionary is missing
+        comp.Sync ([first], {'second': None})
+        self.assertEqual (self.complete (comp, u''), self.words (self.cards [:200]))
+
+    def testPrefix (self):
+        """Prefix matches words regardless of case and diacritics
+        """
+        comp = Completion (self.store)
+        comp.Add (self.dcts ['first'])
+        words = self.words (self.cards [:200])
+        for word in words [::10]:
+            prefix = Fold (word [:2]).upper ()
+            self.assertEqual (self.complete (comp, prefix),
+                [other for other in words if Fold (other).startswith (Fold (prefix))])
+            self.assertTrue (word in self.complete (comp, word))
+        self.assertEqual (len (comp (b'', 5)), 5)
+
+    def complete (self, comp, prefix):
+        return [word.decode ('utf-8') for word in comp (prefix.encode ('utf-8'), 1 << 20)]
+
+    def words (self, cards):
+        """Words of cards in order of completion
+        """
+        return [word for key, word in sorted ((Fold (word).encode ('utf-8'), word)
+            for words, _ in cards for word in words)]
+
+#------------------------------------------------------------------------------#
+# Application                                                                  #
+#------------------------------------------------------------------------------#
+class DictAppTest (unittest.TestCase):
+    """Dictionary application unit tests
+    """
+    def setUp (self):
+        self.path = tempfile.mkdtemp ()
+        self.cards = CorpusCards (300)
+        self.src = CorpusDSL (os.path.join (self.path, 'source.dsl'), self.cards [:200])
+        self.src_dict = CorpusDICT (os.path.join (self.path, 'linked'), self.cards [100:])
+        self.app_type = type ('TestApp', (DictApp,), {
+            'root_path'  : self.path,
+            'dcts_path'  : os.path.join (self.path, 'dicts'),
+            'state_path' : os.path.join (self.path, 'state.store'),
+            'daemon_path': os.path.join (self.path, 'daemon.sock'),
+        })
+
+    def tearDown (self):
+        shutil.rmtree (self.path)
+
+    def testInstall (self):
+        """Installed dictionaries are completed and found until uninstalled
+        """
+        word, word_linked = self.cards [0][0][0], self.cards [-1][0][0]
+        with self.app_type () as app:
+            app.Install (self.src, text_index = True)
+            app.Install (self.src_dict, link = True)
+            self.assertEqual (sorted (dct.Name for dct in app.Dicts.Enabled ()), ['Test DSL', 'linked'])
+            self.assertTrue (word.encode ('utf-8') in app.Completion (word.encode ('utf-8'), 10))
+            self.assertTrue (word_linked.encode ('utf-8') in app.Completion (word_linked.encode ('utf-8'), 10))
+
+        # metadata is cached, dictionaries are opened on demand
+        with self.app_type () as app:
+            self.assertFalse (any (dct.IsOpened for dct in app.Dicts))
+            self.assertEqual ([dct.Name for dct in app.Dicts if dct.TextIndexed], ['Test DSL'])
+            self.assertFalse (any (dct.IsOpened for dct in app.Dicts))
+            self.assertEqual (app.Dicts ['linked'].ByWord [word_linked][0], word_linked)
+
+            app.Uninstall ('Test DSL')
+            self.assertEqual ([dct.Name for dct in app.Dicts], ['linked'])
+            self.assertEqual (app.Completion (word.encode ('utf-8'), 10), [])
+            self.assertEqual (os.listdir (app.dcts_path), ['linked.mdict'])
+
+    def testChangedSource (self):
+        """Linked dictionary with changed source is skipped and can be uninstalled
+        """
+        word_linked = self.cards [-1][0][0]
+        with self.app_type () as app:
+            app.Install (self.src_dict, link = True)
+
+        with io.open (self.src_dict, 'r+b') as stream:
+            data = stream.read ()
+            stream.seek (0)
+            stream.write (data [1:] + data [:1])
+        stat = os.stat (self.src_dict)
+        os.utime (self.src_dict, (stat.st_atime, stat.st_mtime + 10))
+
+        with self.app_type () as app:
+            self.assertEqual (list (app.Dicts.Enabled ()), [])
+            self.assertFalse (app.Dicts ['linked'].Available)
+
+            # completion of words of removed dictionary does not need its source
+            app.Uninstall ('linked')
+            self.assertEqual (len (app.Dicts), 0)
+            self.assertEqual (app.Completion (word_linked.encode ('utf-8'), 10), [])
+
+# vim: nu ft=python columns=120 :
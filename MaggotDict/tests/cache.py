@@ -0,0 +1,65 @@
+# -*- coding: utf-8 -*-
+import unittest
+
+from ..cache import Cache
+
+__all__ = ('CacheTest',)
+#------------------------------------------------------------------------------#
+# Cache                                                                        #
+#------------------------------------------------------------------------------#
+class CacheTest (unittest.TestCase):
+    """Cache unit tests
+    """
+    def testEviction (self):
+        """Least recently used values are evicted first
+        """
+        cache = Cache (10)
+        for key in range (5):
+            self.assertEqual (cache.Set (key, str (key), 3), str (key))
+        self.assertEqual (len (cache), 3)
+        self.assertEqual (cache.Size, 9)
+        self.assertEqual (cache.Get (0), None)
+        self.assertEqual (cache.Get (1), None)
+
+        self.assertEqual (cache.Get (2), '2') # 2 is recently used now
+        cache.Set (5, '5', 3)
+        self.assertEqual (cache.Get (3), None)
+        self.assertEqual ([cache.Get (key) for key in (2, 4, 5)], ['2', '4', '5'])
+
+    def testSize (self):
+        """Replaced and too large values
+        """
+        cache = Cache (10)
+        cache.Set ('a', 'a', 4)
+        cache.Set ('a', 'b', 6)
+        self.assertEqual (cache.Size, 6)
+        self.assertEqual (cache.Get ('a'), 'b')
+
+        self.assertEqual (cache.Set ('c', 'c', 11), 'c')
+        self.assertEqual (cache.Get ('c'), None)
+        self.assertEqual (cache.Get ('a'), 'b')
+
+        cache.Set ('a', 'a', 11) # replaced value is dropped as well
+        self.assertEqual (cache.Get ('a'), None)
+        self.assertEqual ((len (cache), cache.Size), (0, 0))
+
+        # zero capacity caches nothing but values of zero size
+        cache = Cache (0)
+        cache.Set ('a', 'a', 1)
+        self.assertEqual (len (cache), 0)
+
+    def testStats (self):
+        """Hits, misses and clear
+        """
+        cache = Cache (10)
+        cache.Set ('a', 'a', 1)
+        cache.Get ('a')
+        cache.Get ('b')
+        self.assertEqual (cache.Get ('b', 'default'), 'default')
+        self.assertEqual ((cache.Hits, cache.Misses), (1, 2))
+
+        cache.Clear ()
+        self.assertEqual ((len (cache), cache.Size, cache.Capacity), (0, 0, 10))
+        self.assertEqual (cache.Get ('a'), None)
+
+# vim: nu ft=python columns=120 :
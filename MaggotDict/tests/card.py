@@ -0,0 +1,78 @@
+# -*- coding: utf-8 -*-
+import os
+import random
+import shutil
+import unittest
+import tempfile
+
+from ..card import (CardEncode, CardDecode, CardBlockEncode, CardBlockDecode, CardCompress, CardDecompress,
+                    CardDictTrain, CardError, card_zdict)
+from ..sources import Source
+from .corpus import CorpusCards, CorpusDSL
+
+__all__ = ('CardTest',)
+#------------------------------------------------------------------------------#
+# Card                                                                         #
+#------------------------------------------------------------------------------#
+class CardTest (unittest.TestCase):
+    """Card binary format unit tests
+    """
+    def setUp (self):
+        self.path = tempfile.mkdtemp ()
+        with Source (CorpusDSL (os.path.join (self.path, 'card.dsl'), CorpusCards (200))) as source:
+            self.cards = list (source.Cards ())
+
+    def tearDown (self):
+        shutil.rmtree (self.path)
+
+    def testRoundTrip (self):
+        """Cards round trip through binary encoding (with delta coded numbers)
+        """
+        rand, cards = random.Random (0), self.cards
+
+        # numbers of all integer widths
+        for card, number_max in zip (cards, [1 << 7, 1 << 15, 1 << 16, 1 << 32] * len (cards)):
+            card ['numbers'] = sorted (rand.randrange (number_max) for _ in range (rand.randint (0, 3)))
+
+        # unknown names, integer values and numbers beyond integer width (but not their deltas)
+        cards.append ({
+            'words'  : [u'', u'слово', u'wörd'],
+            'numbers': [0, 0, 1 << 16, (1 << 16) + 1, 1 << 32],
+            'body'   : {'name': 'root', 'children': [
+                {'name': 'unknown', 'value': u'unknown tag'},
+                {'name': 'text', 'value': u''},
+                {'name': 'indent', 'value': 0},
+                {'name': 'color', 'value': 1 << 20, 'children': []},
+                {'name': 'unknown', 'children': [{'name': 'text', 'value': u'слово'}]},
+            ]}})
+        cards.append ({'words': [u'word'], 'body': {'name': 'root'}})
+
+        data = []
+        for card in cards:
+            card_data = CardEncode (card)
+            data.append (card_data)
+            self.assertEqual (CardDecode (card_data), dict (card, numbers = card.get ('numbers', [])))
+        self.assertEqual (CardBlockDecode (CardBlockEncode (data)), data)
+        self.assertEqual (CardBlockDecode (CardBlockEncode ([])), [])
+
+    def testErrors (self):
+        """Negative values and deltas beyond integer width are rejected
+        """
+        for card in ({'words': [], 'numbers': [1 << 32, 1 << 33], 'body': {'name': 'root'}},
+                     {'words': [], 'body': {'name': 'indent', 'value': -1}}):
+            with self.assertRaises (CardError):
+                CardEncode (card)
+
+    def testCompress (self):
+        """Compression with and without preset dictionary
+        """
+        data = [CardEncode (card) for card in self.cards]
+        zdicts = [None]
+        if card_zdict:
+            zdicts.append (CardDictTrain (data [::2], 1 << 12))
+            self.assertTrue (0 < len (zdicts [-1]) <= 1 << 12)
+        for zdict in zdicts:
+            for card_data in data:
+                self.assertEqual (CardDecompress (CardCompress (card_data, zdict), zdict), card_data)
+
+# vim: nu ft=python columns=120 :
@@ -0,0 +1,67 @@
+# -*- coding: utf-8 -*-
+import io
+import codecs
+import random
+import struct
+
+__all__ = ('CorpusCards', 'CorpusDSL', 'CorpusDICT', 'CardText',)
+#------------------------------------------------------------------------------#
+# Corpus                                                                       #
+#------------------------------------------------------------------------------#
+corpus_letters = u'abcdefghijklmnopqrstuvwxyz' * 4 + u'éèüöñç'
+
+def CorpusCards (count, seed = 0):
+    """Random (words, translation) cards with unique words
+
+    Some cards have alternative spellings, some words are capitalized or
+    differ from other words by case and diacritics only.
+    """
+    rand, cards, found = random.Random (seed), [], set ()
+    while len (cards) < count:
+        word = u''.join (rand.choice (corpus_letters) for _ in range (rand.randint (2, 10)))
+        words = [word, word.capitalize ()] if rand.random () < .2 else [word]
+        if rand.random () < .1:
+            words [0] = words [0].replace (u'e', u'é')
+        if found.intersection (words) or len (set (words)) < len (words):
+            continue
+        found.update (words)
+        cards.append ((words, u' '.join (u''.join (rand.choice (corpus_letters) for _ in range (rand.randint (2, 9)))
+            for _ in range (rand.randint (1, 4)))))
+    return cards
+
+def CorpusDSL (path, cards, name = u'Test DSL'):
+    """Write DSL source of cards
+    """
+    lines = [u'#NAME "{}"'.format (name), u'#INDEX_LANGUAGE "English"', u'#CONTENTS_LANGUAGE "Russian"']
+    for words, translation in cards:
+        lines.extend (words)
+        lines.append (u'\t[m1][trn]{}[/trn][/m]'.format (translation))
+    with io.open (path, 'wb') as stream:
+        stream.write (codecs.BOM_UTF16_LE + u''.join (line + u'\r\n' for line in lines).encode ('utf-16-le'))
+    return path
+
+def CorpusDICT (path, cards):
+    """Write DICT source of cards (the first word of each card is its headword)
+
+    Path is a prefix of data (.dict) and index (.idx) files, returns name of
+    data file.
+    """
+    desc_struct = struct.Struct ('>2I')
+    with io.open (path + '.dict', 'wb') as data, io.open (path + '.idx', 'wb') as index:
+        for word, translation in sorted (((words [0], translation) for words, translation in cards),
+                key = lambda card: card [0].encode ('utf-8')):
+            body = u'{}\n  {}\n'.format (word, translation).encode ('utf-8')
+            index.write (word.encode ('utf-8') + b'\x00' + desc_struct.pack (data.tell (), len (body)))
+            data.write (body)
+    return path + '.dict'
+
+def CardText (card):
+    """Text of card body
+    """
+    def text (node):
+        if node ['name'] == 'text':
+            return node.get ('value', u'')
+        return u''.join (text (child) for child in node.get ('children', ()))
+    return text (card ['body'])
+
+# vim: nu ft=python columns=120 :
@@ -0,0 +1,401 @@
+# -*- coding: utf-8 -*-
+import io
+import os
+import random
+import shutil
+import struct
+import unittest
+import tempfile
+
+from ..cache import Cache
+from ..dictionary import Dictionary, DictionaryArray, DictionaryTree, DictionaryError, CardRange
+from ..fold import Fold
+from ..metrics import Metrics
+from ..sources import Source
+from ..text import TextTokens, CardTokens
+from ..pretzel.store import FileStore
+from .corpus import CorpusCards, CorpusDSL, CorpusDICT, CardText
+
+__all__ = ('DictionaryTest', 'DictionaryArrayTest', 'DictionaryTreeTest',)
+#------------------------------------------------------------------------------#
+# Dictionary                                                                   #
+#------------------------------------------------------------------------------#
+class DictionaryTest (unittest.TestCase):
+    """Dictionary unit tests
+    """
+    def setUp (self):
+        self.path = tempfile.mkdtemp ()
+        self.cards = CorpusCards (300)
+        self.src = CorpusDSL (os.path.join (self.path, 'source.dsl'), self.cards)
+        self.words = sorted ((word for words, _ in self.cards for word in words),
+            key = lambda word: word.encode ('utf-8'))
+
+    def tearDown (self):
+        shutil.rmtree (self.path)
+
+    def testCompile (self):
+        """Cards are read back in card and block layouts (mapped or not)
+        """
+        for block_size in (None, 1024):
+            for mapped in (False, True):
+                with Dictionary (self.compile ('compile', block_size = block_size), mapped = mapped) as dct:
+                    self.assertEqual (dct.Mapped, mapped)
+                    self.assertEqual ((dct.Name, dct.Size), ('Test DSL', len (self.words)))
+                    for words, translation in self.cards:
+                        for word in words:
+                            self.assertEqual (dct.ByWord [word][0], word)
+                            self.assertEqual (sorted (dct.ByWord [word][1]['words']), sorted (words))
+                            self.assertEqual (CardText (dct.ByWord [word][1]), translation)
+                    for number, word in enumerate (self.words):
+                        self.assertEqual (dct.ByIndex [number], dct.ByWord [word])
+                    self.assertEqual (dct.ByWord [u'missing'], (None, None))
+
+    def testMapped (self):
+        """Mapped dictionary reads the same ranges
+        """
+        for block_size in (None, 1024):
+            dst = self.compile ('mapped', block_size = block_size)
+            with Dictionary (dst, cache_size = 0) as dct, Dictionary (dst, cache_size = 0, mapped = True) as dct_mapped:
+                first, last = self.words [0], self.words [-1]
+                cards = list (dct.ByWord [first:last])
+                self.assertEqual (len (cards), len (self.words) - 1)
+                self.assertEqual (list (dct_mapped.ByWord [first:last]), cards)
+                self.assertEqual (list (reversed (dct_mapped.ByWord [first:last])), cards [::-1])
+                self.assertEqual (dct_mapped.ByIndex [0], cards [0])
+
+    def testRecompile (self):
+        """Cards of unchanged entries are taken from base dictionary
+        """
+        cards = list (self.cards)
+        cards [100] = (cards [100][0], u'changed translation')
+        del cards [200]
+        cards.insert (250, ([u'insertedword'], u'inserted translation'))
+        src = CorpusDSL (os.path.join (self.path, 'edited.dsl'), cards)
+
+        for block_size in (None, 1024):
+            base = self.compile ('base', block_size = block_size)
+            with Dictionary (base) as dct:
+                self.assertTrue (dct.fingerprint_index is not None)
+
+            enabled = Metrics.Enabled ()
+            Metrics.Enable ()
+            Metrics.Clear ()
+            try:
+                dst_base = self.compile ('recompile', src, block_size = block_size, base = base)
+                reused = dict ((scope, counters) for scope, _, counters in Metrics.Report ()).get (
+                    'compile', {}).get ('cards_reused', 0)
+            finally:
+                Metrics.Enable (enabled)
+                Metrics.Clear ()
+            self.assertEqual (reused, len (cards) - 2) # all cards but changed and inserted ones
+
+            dst = self.compile ('edited', src, block_size = block_size)
+            with Dictionary (dst, cache_size = 0) as dct, Dictionary (dst_base, cache_size = 0) as dct_base:
+                self.assertEqual ([word for word, _ in dct_base.ByWord.index [b'':]],
+                    [word for word, _ in dct.ByWord.index [b'':]])
+                for words, translation in cards:
+                    self.assertEqual (dct_base.ByWord [words [0]], dct.ByWord [words [0]])
+                    self.assertEqual (CardText (dct_base.ByWord [words [0]][1]), translation)
+
+    def testFolded (self):
+        """Words are found regardless of case and diacritics if there is no exact match
+        """
+        with Dictionary (self.compile ('folded')) as dct:
+            for word in self.words:
+                folded = dct.ByWord [Fold (word).upper ()]
+                self.assertEqual (Fold (folded [0]), Fold (word))
+                self.assertTrue (folded [0] in folded [1]['words'])
+                self.assertEqual (dct.ByWord [word][0], word)
+            self.assertEqual (dct.ByWord [u''], (None, None))
+
+    def testSuggest (self):
+        """Misspelled words are suggested
+        """
+        with Dictionary (self.compile ('suggest')) as dct:
+            for word in self.words [::10]:
+                suggestions = dct.Suggest (word [:2] + word [3:], 10)
+                self.assertTrue ((1, word) in suggestions or len (word) < 3, (word, suggestions))
+                self.assertEqual (suggestions, sorted (suggestions))
+                self.assertEqual (dct.Suggest (word, 1), [(0, word)])
+            self.assertEqual (dct.Suggest (u''), [])
+
+        with Dictionary (self.compile ('suggest', fuzzy_index = False)) as dct:
+            self.assertEqual (dct.ByWord [self.words [0]][0], self.words [0])
+            self.assertEqual (dct.Suggest (self.words [0]), [])
+
+    def testSearch (self):
+        """Full-text search against scan of all cards
+        """
+        with Dictionary (self.compile ('search')) as dct:
+            self.assertEqual (dct.Search (u'word'), [])
+
+        rand = random.Random (0)
+        with Dictionary (self.compile ('search', text_index = True), cache_size = 0) as dct:
+            self.assertTrue (dct.TextIndexed)
+
+            # cards are matched once (by the first number of their words)
+            numbers = {}
+            for number, entry in dct.ByIndex.index [0:]:
+                numbers.setdefault (tuple (entry [:-1]), number)
+            cards = [dct.ByIndex [number] for number in sorted (numbers.values ())]
+            cards_tokens = [CardTokens (card) for word, card in cards]
+
+            tokens = sorted (set ().union (*cards_tokens))
+            texts = rand.sample (tokens, 50) + [u' '.join (rand.sample (sorted (card_tokens), 2))
+                for card_tokens in rand.sample (cards_tokens, 50) if len (card_tokens) > 1]
+            texts.extend ((tokens [0].upper (), u'{} {}'.format (tokens [0], tokens [1]), u'missingtoken', u''))
+            for text in texts:
+                text_tokens = TextTokens (text)
+                found = [card for card, card_tokens in zip (cards, cards_tokens)
+                    if text_tokens and text_tokens <= card_tokens]
+                self.assertEqual (dct.Search (text), found)
+                self.assertEqual (dct.Search (text, 1), found [:1])
+
+    def testGetMany (self):
+        """Batch lookup matches single lookups
+        """
+        rand = random.Random (0)
+        keys = rand.sample (self.words, 100) + [Fold (word).upper () for word in rand.sample (self.words, 20)]
+        keys.extend ((u'missing', u'', None, keys [0], keys [-1], u'\uffff'))
+        rand.shuffle (keys)
+        for block_size in (None, 1024):
+            with Dictionary (self.compile ('many', block_size = block_size), cache_size = 0) as dct:
+                found = dct.ByWord.GetMany (keys)
+                self.assertEqual (found, [dct.ByWord [key] if key else (None, None) for key in keys])
+                self.assertEqual (dct.ByWord.GetMany ([]), [])
+
+    def testCardRange (self):
+        """Ranges of words are indexed, sliced and reversed
+        """
+        with Dictionary (self.compile ('range')) as dct:
+            words = self.words
+            cards = [dct.ByWord [word] for word in words]
+
+            self.assertEqual (list (dct.ByWord [words [10]:words [20]]), cards [10:20])
+            self.assertEqual (list (dct.ByWord [words [10] + u'\0':words [20]]), cards [11:20])
+            self.assertEqual (list (dct.ByWord [words [-5]:]), cards [-5:])
+            self.assertEqual (list (dct.ByWord [u'':]), cards)
+            self.assertEqual (list (dct.ByWord [u'\uffff':]), [])
+            self.assertEqual (list (dct.ByWord [words [20]:words [10]]), [])
+
+            cards_range = dct.ByWord [words [10]:words [20]]
+            self.assertEqual (len (cards_range), 10)
+            self.assertEqual ((cards_range [0], cards_range [9], cards_range [-1]),
+                (cards [10], cards [19], cards [19]))
+            self.assertEqual (list (reversed (cards_range)), cards [10:20][::-1])
+            for index in (10, -11):
+                with self.assertRaises (IndexError):
+                    cards_range [index]
+
+            # sub-ranges
+            self.assertEqual (list (cards_range [2:5]), cards [12:15])
+            self.assertEqual (list (cards_range [-3:]), cards [17:20])
+            self.assertEqual (list (cards_range [:100]), cards [10:20])
+            self.assertEqual (list (cards_range [5:2]), [])
+            self.assertEqual (len (cards_range [2:5][1:]), 2)
+            with self.assertRaises (ValueError):
+                cards_range [::2]
+
+            # ranges up to the end and empty ranges
+            tail = dct.ByWord [words [-3]:]
+            self.assertEqual ((len (tail), tail [-1]), (3, cards [-1]))
+            empty = CardRange (dct, None, None)
+            self.assertEqual ((len (empty), list (empty), list (reversed (empty))), (0, [], []))
+
+    def testLink (self):
+        """Linked dictionary reads cards from source
+        """
+        src = CorpusDICT (os.path.join (self.path, 'source'), self.cards)
+        with Source (src) as source:
+            cards = sorted ((card ['words'][0], card) for card in source.Cards ())
+
+        with Dictionary.Link (src, os.path.join (self.path, 'link.mdict'), memory = 1 << 12) as dct:
+            self.assertEqual ((dct.Name, dct.Size), ('source', len (cards)))
+            for number, (word, card) in enumerate (cards):
+                self.assertEqual (dct.ByWord [word], (word, card))
+                self.assertEqual (dct.ByIndex [number], (word, card))
+                self.assertEqual (dct.ByWord [Fold (word).upper ()][0].lower (), word.lower ())
+            self.assertEqual (list (dct.ByWord [cards [5][0]:cards [8][0]]), cards [5:8])
+            self.assertEqual (dct.ByWord.GetMany ([cards [1][0], u'missing']), [cards [1], (None, None)])
+            self.assertEqual (dct.Suggest (cards [0][0]), [])
+            self.assertEqual (dct.SourceFiles, Dictionary.SourceCheck (dct.SourceFiles))
+
+    def testLinkChanged (self):
+        """Changed source of linked dictionary is detected on the first card load
+        """
+        src = CorpusDICT (os.path.join (self.path, 'source'), self.cards)
+        dst = os.path.join (self.path, 'link.mdict')
+        Dictionary.Link (src, dst).Dispose ()
+        word = self.cards [0][0][0]
+
+        # touched source with the same content
+        stat = os.stat (src)
+        os.utime (src, (stat.st_atime, stat.st_mtime + 10))
+        with Dictionary (dst) as dct:
+            self.assertEqual (dct.ByWord [word][0], word)
+
+        # changed content of the same size
+        with io.open (src, 'r+b') as stream:
+            data = stream.read ()
+            stream.seek (0)
+            stream.write (data [1:] + data [:1])
+        os.utime (src, (stat.st_atime, stat.st_mtime + 20))
+        with Dictionary (dst) as dct:
+            self.assertEqual (list (dct.ByWord.index [word.encode ('utf-8'):]) [0][0], word.encode ('utf-8'))
+            with self.assertRaises (DictionaryError):
+                dct.ByWord [word]
+            with self.assertRaises (DictionaryError):
+                Dictionary.SourceCheck (dct.SourceFiles)
+
+        # changed size and missing file
+        with io.open (src, 'ab') as stream:
+            stream.write (b'appended')
+        with Dictionary (dst) as dct, self.assertRaises (DictionaryError):
+            dct.ByWord [word]
+        os.unlink (src)
+        with Dictionary (dst) as dct, self.assertRaises (DictionaryError):
+            dct.ByWord [word]
+
+    def compile (self, name, src = None, **options):
+        """Compile source (corpus source by default) with options
+        """
+        dst = os.path.join (self.path, '{}.mdict'.format (name))
+        Dictionary.Compile (src or self.src, dst, **options).Dispose ()
+        return dst
+
+#------------------------------------------------------------------------------#
+# Dictionary Array                                                             #
+#------------------------------------------------------------------------------#
+class DictionaryArrayTest (unittest.TestCase):
+    """Number array unit tests
+    """
+    def testArray (self):
+        """Entries by number and slices of numbers
+        """
+        entry = struct.Struct ('>QH')
+        entries = [(number << 20, number & 0xffff) for number in range (1000)]
+        data = b''.join (entry.pack (*value) for value in entries)
+        reads = []
+        def data_read (offset, size):
+            reads.append (size)
+            return data [offset:offset + size]
+        array = DictionaryArray (data_read, len (data), '>QH')
+
+        self.assertEqual (len (array), len (entries))
+        self.assertEqual ([array.get (number) for number in (0, 999, 500)], [entries [0], entries [999], entries [500]])
+        self.assertEqual ([array.get (number, 'none') for number in (-1, 1000)], ['none', 'none'])
+        self.assertEqual (list (array [:]), list (enumerate (entries)))
+        for start, stop in ((0, 1), (255, 257), (100, 900), (-10, 10), (990, 2000), (500, 500), (600, 500)):
+            self.assertEqual (list (array [start:stop]), list (enumerate (entries)) [max (start, 0):stop])
+        self.assertEqual (list (array [998:]), [(998, entries [998]), (999, entries [999])])
+        with self.assertRaises (TypeError):
+            array [0]
+
+        # slices are read in chunks
+        del reads [:]
+        list (array [:])
+        self.assertEqual (len (reads), -(-len (entries) // DictionaryArray.chunk_size))
+        self.assertEqual (len (DictionaryArray (data_read, 0, '>QH')), 0)
+
+#------------------------------------------------------------------------------#
+# Dictionary Tree                                                              #
+#------------------------------------------------------------------------------#
+class DictionaryTreeTest (unittest.TestCase):
+    """Static tree unit tests
+    """
+    def setUp (self):
+        self.path = tempfile.mkdtemp ()
+        self.store = FileStore (os.path.join (self.path, 'tree.store'), mode = 'n')
+
+    def tearDown (self):
+        self.store.Dispose ()
+        shutil.rmtree (self.path)
+
+    def testLookup (self):
+        """Lookup of present and missing keys
+        """
+        items = self.items (20000)
+        tree = self.tree (items)
+        self.assertTrue (tree.page_load (tree.root).level > 0)
+
+        for key, value in items:
+            self.assertEqual (tree.get (key), value)
+        entries = dict (items)
+        for key, _ in items [::100]:
+            self.assertEqual (tree.get (key + b'\x00'), None)
+            self.assertEqual (tree.get (key [:-1], 'missing'), entries.get (key [:-1], 'missing'))
+        self.assertEqual (tree.get (b''), None)
+        self.assertEqual (tree.get (b'\xff' * 16), None)
+
+    def testRange (self):
+        """Slices of keys
+        """
+        items = self.items (20000)
+        tree = self.tree (items, Cache (0))
+        rand = random.Random (0)
+
+        self.assertEqual (list (tree [:]), items)
+        self.assertEqual (list (tree [b'':]), items)
+        self.assertEqual (list (tree [b'\xff':]), [])
+        self.assertEqual (list (tree [:b'']), [])
+        for _ in range (100):
+            start, stop = sorted (rand.choice (items) [0] + rand.choice ((b'', b'\x00')) for _ in range (2))
+            self.assertEqual (list (tree [start:stop]), [item for item in items if start <= item [0] < stop])
+            self.assertEqual (list (tree [start:]), [item for item in items if start <= item [0]])
+            self.assertEqual (list (tree [:stop]), [item for item in items if item [0] < stop])
+        with self.assertRaises (TypeError):
+            tree [b'']
+
+    def testEmpty (self):
+        """Tree without items
+        """
+        self.assertEqual (DictionaryTree.Build (self.store, [], '>I'), (0, 0))
+        tree = self.tree ([])
+        self.assertEqual (tree.get (b''), None)
+        self.assertEqual (list (tree [:]), [])
+
+    def testLargeKeys (self):
+        """Incompressible keys larger than page and the longest key
+        """
+        rand = random.Random (0)
+        for size in (1100, 3000):
+            items = sorted ((bytes (bytearray (rand.getrandbits (8) for _ in range (size))), (index,))
+                for index in range (2))
+            self.assertEqual (list (self.tree (items) [:]), items)
+
+        keys = sorted (set (bytes (bytearray (rand.getrandbits (8) for _ in range (rand.randint (1, 3000))))
+            for _ in range (64)))
+        keys.append (b'\xff' * DictionaryTree.page_data_max)
+        items = [(key, (index,)) for index, key in enumerate (keys)]
+        tree = self.tree (items)
+
+        for key, value in items:
+            self.assertEqual (tree.get (key), value)
+        self.assertEqual (list (tree [:]), items)
+
+    def testErrors (self):
+        """Unsorted and too long keys
+        """
+        with self.assertRaises (DictionaryError):
+            DictionaryTree.Build (self.store, [(b'b', (0,)), (b'a', (1,))], '>I')
+        with self.assertRaises (DictionaryError):
+            DictionaryTree.Build (self.store, [(b'a', (0,)), (b'a', (1,))], '>I')
+        with self.assertRaises (DictionaryError):
+            DictionaryTree.Build (self.store, [(b'a' * (DictionaryTree.page_data_max + 1), (0,))], '>I')
+
+    def items (self, count):
+        """Sorted items with shared prefixes of keys
+        """
+        rand, keys = random.Random (0), set ()
+        while len (keys) < count:
+            keys.add (u''.join (rand.choice (u'abcdeé') for _ in range (rand.randint (1, 12))).encode ('utf-8'))
+        return [(key, (index, index >> 3)) for index, key in enumerate (sorted (keys))]
+
+    def tree (self, items, pages = None):
+        """Build tree and open it
+        """
+        entry_format = '>IH' if items and len (items [0][1]) > 1 else '>I'
+        root, size = DictionaryTree.Build (self.store, items, entry_format)
+        return DictionaryTree (self.store.Load, pages or Cache (1 << 20), {}, root, entry_format)
+
+# vim: nu ft=python columns=120 :
@@ -0,0 +1,87 @@
+# -*- coding: utf-8 -*-
+import io
+import os
+import zlib
+import gzip
+import random
+import shutil
+import struct
+import unittest
+import tempfile
+
+from ..sources import Source
+from ..sources.dictzip import DictZip, DictZipError
+from .corpus import CorpusCards, CorpusDICT
+
+__all__ = ('DictZipTest',)
+#------------------------------------------------------------------------------#
+# DictZip                                                                      #
+#------------------------------------------------------------------------------#
+class DictZipTest (unittest.TestCase):
+    """Dictzip reader unit tests
+    """
+    chunk_size = 1000
+
+    def setUp (self):
+        self.path = tempfile.mkdtemp ()
+        self.src = CorpusDICT (os.path.join (self.path, 'dictzip'), CorpusCards (500))
+        with io.open (self.src, 'rb') as stream:
+            self.data = stream.read ()
+        self.src_dz = dictzip_write (self.src + '.dz', self.data, self.chunk_size)
+
+    def tearDown (self):
+        shutil.rmtree (self.path)
+
+    def testRead (self):
+        """Reads across chunk boundaries (with and without cache)
+        """
+        data, chunk_size = self.data, self.chunk_size
+        with io.open (self.src_dz, 'rb') as stream:
+            self.assertEqual (gzip.GzipFile (fileobj = stream).read (), data)
+
+        # chunk boundaries, ranges of several chunks, ranges beyond the end and random ranges
+        rand = random.Random (0)
+        ranges = [(max (0, chunk * chunk_size + shift), size) for chunk in (0, 1, len (data) // chunk_size)
+            for shift in (-1, 0, 1) for size in (0, 1, 2, chunk_size, 3 * chunk_size + 1)]
+        ranges.extend ((rand.randrange (len (data)), rand.randint (1, 4 * chunk_size)) for _ in range (1000))
+        for cache_size in (0, 4 * chunk_size, None):
+            with io.open (self.src_dz, 'rb') as stream:
+                dictzip = DictZip (stream, cache_size)
+                for offset, size in ranges:
+                    self.assertEqual (dictzip.Read (offset, size), data [offset:offset + size])
+                self.assertEqual (dictzip [10:20], data [10:20])
+
+    def testSource (self):
+        """DICT source on dictzip data
+        """
+        with Source (self.src) as source, Source (self.src_dz) as source_dz:
+            self.assertEqual (list (source.Cards ()), list (source_dz.Cards ()))
+
+    def testErrors (self):
+        """Plain gzip is not a dictzip
+        """
+        src_gz = os.path.join (self.path, 'plain.gz')
+        with gzip.open (src_gz, 'wb') as stream:
+            stream.write (self.data)
+        with io.open (src_gz, 'rb') as stream:
+            with self.assertRaises (DictZipError):
+                DictZip (stream)
+
+def dictzip_write (dst, data, chunk_size):
+    """Write data as dictzip file (chunks are compressed independently)
+    """
+    compressor, chunks = zlib.compressobj (9, zlib.DEFLATED, -zlib.MAX_WBITS), []
+    for offset in range (0, len (data), chunk_size):
+        chunks.append (compressor.compress (data [offset:offset + chunk_size]) + compressor.flush (zlib.Z_FULL_FLUSH))
+    chunks.append (chunks.pop () + compressor.flush ())
+
+    extra = struct.pack ('<3H{}H'.format (len (chunks)), 1, chunk_size, len (chunks), *map (len, chunks))
+    extra = struct.pack ('<2sH', b'RA', len (extra)) + extra
+    with io.open (dst, 'wb') as stream:
+        stream.write (struct.pack ('<HBBIBBH', 0x8b1f, 8, DictZip.flag_extra | DictZip.flag_name, 0, 2, 3,
+            len (extra)) + extra + b'dictzip.dict\x00')
+        stream.write (b''.join (chunks))
+        stream.write (struct.pack ('<2I', zlib.crc32 (data) & 0xffffffff, len (data) & 0xffffffff))
+    return dst
+
+# vim: nu ft=python columns=120 :
@@ -0,0 +1,31 @@
+# -*- coding: utf-8 -*-
+import unittest
+
+from ..fold import Fold
+from ..dictionary import FoldKey
+
+__all__ = ('FoldTest',)
+#------------------------------------------------------------------------------#
+# Fold                                                                         #
+#------------------------------------------------------------------------------#
+class FoldTest (unittest.TestCase):
+    """Case and diacritics folding unit tests
+    """
+    def testFold (self):
+        """Case and diacritics are folded
+        """
+        for word in (u'Café', u'cafe', u'CAFÉ', u'café'):
+            self.assertEqual (Fold (word), u'cafe')
+        self.assertEqual (Fold (u'слОво'), u'слово')
+        self.assertEqual (Fold (u''), u'')
+
+    def testKey (self):
+        """Folded key keeps variants of the word adjacent
+        """
+        words = [u'cafe', u'Café', u'cafeteria', u'Cafe', u'cafe au lait']
+        keys = sorted (FoldKey (word) for word in words)
+        self.assertEqual ([key.split (b'\0') [1].decode ('utf-8') for key in keys],
+            [u'Cafe', u'Café', u'cafe', u'cafe au lait', u'cafeteria'])
+        self.assertTrue (all (key.startswith (b'cafe\0') for key in keys [:3]))
+
+# vim: nu ft=python columns=120 :
@@ -0,0 +1,48 @@
+# -*- coding: utf-8 -*-
+import random
+import unittest
+
+from ..fuzzy import FuzzyVariants, FuzzyDistance
+
+__all__ = ('FuzzyTest',)
+#------------------------------------------------------------------------------#
+# Fuzzy                                                                        #
+#------------------------------------------------------------------------------#
+class FuzzyTest (unittest.TestCase):
+    """Fuzzy matching unit tests
+    """
+    def testDistance (self):
+        """Edit distance with transpositions and limit
+        """
+        for source, target, distance in ((u'word', u'word', 0), (u'word', u'wrd', 1), (u'word', u'wordy', 1),
+                (u'word', u'wrod', 1), (u'word', u'ward', 1), (u'word', u'odrw', 3), (u'', u'ab', 2)):
+            self.assertEqual (FuzzyDistance (source, target, 3), distance)
+            self.assertEqual (FuzzyDistance (target, source, 3), distance)
+            self.assertEqual (FuzzyDistance (source, target, distance - 1) if distance else None, None)
+        self.assertEqual (FuzzyDistance (u'a', u'abcd', 2), None)
+
+    def testVariants (self):
+        """Words within distance share a variant (words are longer than distance)
+        """
+        self.assertEqual (FuzzyVariants (u'word', 0), {u'word'})
+        self.assertEqual (FuzzyVariants (u'word', 1), {u'word', u'ord', u'wrd', u'wod', u'wor'})
+        self.assertEqual (FuzzyVariants (u'wordsmith', 0, 4), {u'word'})
+
+        rand, letters = random.Random (0), u'abcde'
+        for _ in range (500):
+            source = u''.join (rand.choice (letters) for _ in range (rand.randint (3, 9)))
+            target = list (source)
+            for _ in range (rand.randint (1, 2)):
+                index = rand.randrange (len (target) + 1)
+                operation = rand.choice ('idr')
+                if operation == 'i':
+                    target.insert (index, rand.choice (letters))
+                elif operation == 'd' and len (target) > 1:
+                    target.pop (min (index, len (target) - 1))
+                else:
+                    target [min (index, len (target) - 1)] = rand.choice (letters)
+            target = u''.join (target)
+            if len (target) > 2 and FuzzyDistance (source, target, 2) is not None:
+                self.assertTrue (FuzzyVariants (source, 2) & FuzzyVariants (target, 2), (source, target))
+
+# vim: nu ft=python columns=120 :
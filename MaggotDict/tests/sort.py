@@ -0,0 +1,47 @@
+# -*- coding: utf-8 -*-
+import random
+import unittest
+
+from ..sort import ExternalSort
+
+__all__ = ('ExternalSortTest',)
+#------------------------------------------------------------------------------#
+# External Sort                                                                #
+#------------------------------------------------------------------------------#
+class ExternalSortTest (unittest.TestCase):
+    """External sort unit tests
+    """
+    def testMemory (self):
+        """Items sorted in memory
+        """
+        items = self.items (1000)
+        with ExternalSort () as sort:
+            for item in items:
+                sort.Add (item)
+            self.assertEqual (len (sort), len (items))
+            self.assertEqual (list (sort.Sorted ()), sorted (items))
+
+        with ExternalSort (1 << 12) as sort:
+            self.assertEqual (list (sort.Sorted ()), [])
+
+    def testMerge (self):
+        """Many runs merged in several levels
+        """
+        items = self.items (20000)
+        with ExternalSort (1 << 12) as sort:
+            sort.merge_max = 4
+            runs_max = 0
+            for item in items:
+                sort.Add (item)
+                runs_max = max (runs_max, len (sort.runs))
+            self.assertEqual (len (sort), len (items))
+            self.assertEqual (list (sort.Sorted ()), sorted (items))
+
+        # about 700 runs are merged in at most 5 levels, each level keeps less than merge_max open runs
+        self.assertTrue (runs_max <= 3 * 5, runs_max)
+
+    def items (self, count):
+        rand = random.Random (0)
+        return [(u'{:08}'.format (rand.randrange (10 ** 8)), index) for index in range (count)]
+
+# vim: nu ft=python columns=120 :
@@ -0,0 +1,45 @@
+# -*- coding: utf-8 -*-
+import random
+import unittest
+
+from ..text import TextTokens, CardTokens, PostingsEncode, PostingsDecode
+
+__all__ = ('TextTest',)
+#------------------------------------------------------------------------------#
+# Text                                                                         #
+#------------------------------------------------------------------------------#
+class TextTest (unittest.TestCase):
+    """Full-text tokens and postings unit tests
+    """
+    def testTokens (self):
+        """Tokens are folded, single characters are skipped
+        """
+        self.assertEqual (TextTokens (u'Café, CAFE a cafe-au-lait'), {u'cafe', u'au', u'lait'})
+        self.assertEqual (TextTokens (u''), set ())
+
+        card = {'words': [u'word'], 'body': {'name': 'root', 'children': [
+            {'name': 'text', 'value': u'Heading'},
+            {'name': 'translation', 'children': [{'name': 'text', 'value': u'Translation one'}]},
+            {'name': 'example', 'children': [{'name': 'text', 'value': u'example'}]},
+        ]}}
+        self.assertEqual (CardTokens (card), {u'translation', u'one'})
+
+        # whole text is used if there is no translation
+        card ['body']['children'].pop (1)
+        self.assertEqual (CardTokens (card), {u'heading'})
+
+    def testPostings (self):
+        """Postings round trip
+        """
+        rand = random.Random (0)
+        postings = [[], [0], [0, 0, 1], [0x7f, 0x80, 0x3fff, 0x4000, 1 << 32, 1 << 40]]
+        for delta_max in (1 << 3, 1 << 10, 1 << 20):
+            number, numbers = 0, []
+            for _ in range (1000):
+                number += rand.randrange (delta_max)
+                numbers.append (number)
+            postings.append (numbers)
+        for numbers in postings:
+            self.assertEqual (PostingsDecode (PostingsEncode (numbers)), numbers)
+
+# vim: nu ft=python columns=120 :
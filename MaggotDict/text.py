@@ -0,0 +1,71 @@
+# -*- coding: utf-8 -*-
+import re
+import array
+
+from .fold import Fold
+
+__all__ = ('TextTokens', 'CardTokens', 'PostingsEncode', 'PostingsDecode',)
+#------------------------------------------------------------------------------#
+# Tokens                                                                       #
+#------------------------------------------------------------------------------#
+text_token = re.compile (r'\w\w+', re.UNICODE)
+text_skip_names = {'comment', 'example', 'transcript', 'sound', 'lang', 'url'}
+
+def TextTokens (text):
+    """Set of folded tokens of the text
+    """
+    return set (text_token.findall (Fold (text)))
+
+def CardTokens (card):
+    """Set of tokens of the card translations
+
+    Only text of "translation" nodes is used, if card does not have any,
+    whole text of the card (except comments, examples and alike) is used.
+    """
+    translations, texts = [], []
+    def node_walk (node, translation):
+        name = node ['name']
+        if name in text_skip_names:
+            return
+        translation = translation or name == 'translation'
+        if name == 'text':
+            (translations if translation else texts).append (node.get ('value', ''))
+        for child in node.get ('children', ()):
+            node_walk (child, translation)
+    node_walk (card ['body'], False)
+
+    return TextTokens (' '.join (translations or texts))
+
+#------------------------------------------------------------------------------#
+# Postings                                                                     #
+#------------------------------------------------------------------------------#
+# Postings are sorted card numbers encoded as deltas, each delta is a varint
+# (seven bits per byte, least significant first, high bit marks continuation).
+#------------------------------------------------------------------------------#
+def PostingsEncode (numbers):
+    """Encode sorted card numbers
+    """
+    data, number_prev = array.array ('B'), 0
+    for number in numbers:
+        delta, number_prev = number - number_prev, number
+        while delta > 0x7f:
+            data.append (delta & 0x7f | 0x80)
+            delta >>= 7
+        data.append (delta)
+    return bytes (bytearray (data))
+
+def PostingsDecode (data):
+    """Decode sorted card numbers
+    """
+    numbers, number, delta, shift = [], 0, 0, 0
+    for byte in bytearray (data):
+        delta |= (byte & 0x7f) << shift
+        if byte & 0x80:
+            shift += 7
+        else:
+            number += delta
+            numbers.append (number)
+            delta, shift = 0, 0
+    return numbers
+
+# vim: nu ft=python columns=120 :
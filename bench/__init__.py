@@ -0,0 +1,11 @@
+# -*- coding: utf-8 -*-
+"""Maggot dictionary benchmarks
+
+Run with "python -m bench" from the root of the repository.
+"""
+from .corpus import CorpusWords, CorpusDSL, CorpusDICT
+from .suite import Benchmark, BenchmarkCompare
+
+__all__ = ('CorpusWords', 'CorpusDSL', 'CorpusDICT', 'Benchmark', 'BenchmarkCompare',)
+
+# vim: nu ft=python columns=120 :
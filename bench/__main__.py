@@ -0,0 +1,107 @@
+# -*- coding: utf-8 -*-
+import os
+import sys
+import json
+import getopt
+import shutil
+import tempfile
+
+from .suite import Benchmark, BenchmarkCompare
+
+#------------------------------------------------------------------------------#
+# Main                                                                         #
+#------------------------------------------------------------------------------#
+def Usage ():
+    sys.stderr.write ('''Usage: python -m bench [options]
+options:
+    -n <cards>        : number of cards of generated sources (default: 20000)
+    -x <complexity>   : complexity of generated cards, 1 to 3  (default: 2)
+    -r <seed>         : random seed of generated sources       (default: 0)
+    -B <size>         : compile with <size> KiB blocks
+    -M <size>         : compile within <size> MiB memory budget
+    -d <dir>          : working directory (generated sources are reused)
+    -o <file>         : write json results to file
+    -c <file>         : compare results with results of previous run
+    -?|h              : show this help message
+''')
+
+def Main ():
+    try:
+        opts, args = getopt.getopt (sys.argv [1:], '?hn:x:r:B:M:d:o:c:')
+    except getopt.GetoptError as error:
+        sys.stderr.write ('{}\n'.format (error))
+        Usage ()
+        return 1
+
+    size, complexity, seed, block_size, memory = 20000, 2, 0, None, None
+    path, output, compare = None, None, None
+    for opt, arg in opts:
+        if opt in ('-n', '-x', '-r', '-B', '-M'):
+            try:
+                value = int (arg)
+            except ValueError:
+                sys.stderr.write ('{} requires integer argument: {}\n'.format (opt, arg))
+                return 1
+            if opt == '-n':
+                size = value
+            elif opt == '-x':
+                complexity = value
+            elif opt == '-r':
+                seed = value
+            elif opt == '-B':
+                block_size = value << 10
+            else:
+                memory = value << 20
+        elif opt == '-d':
+            path = arg
+        elif opt == '-o':
+            output = arg
+        elif opt == '-c':
+            compare = arg
+        else:
+            Usage ()
+            return 0
+
+    # run
+    path_temp = path is None
+    if path_temp:
+        path = tempfile.mkdtemp (prefix = 'mdict-bench-')
+    elif not os.path.isdir (path):
+        os.makedirs (path)
+    try:
+        def report (name, value):
+            sys.stderr.write ('{:<36}{:>16.3f}\n'.format (name, value))
+            sys.stderr.flush ()
+        results = Benchmark (path, size, complexity, seed, block_size, report, memory)
+    finally:
+        if path_temp:
+            shutil.rmtree (path)
+
+    results = {
+        'python'    : sys.version.split () [0],
+        'params'    : {'cards': size, 'complexity': complexity, 'seed': seed, 'block_size': block_size,
+                       'memory': memory},
+        'results'   : results,
+    }
+    if output:
+        with open (output, 'w') as stream:
+            json.dump (results, stream, indent = 2, sort_keys = True)
+    else:
+        json.dump (results, sys.stdout, indent = 2, sort_keys = True)
+        sys.stdout.write ('\n')
+
+    # compare
+    if compare:
+        with open (compare) as stream:
+            results_old = json.load (stream)
+        if results_old ['params'] != results ['params']:
+            sys.stderr.write ('warning: runs have different parameters\n')
+        for name, value_old, value_new, change in BenchmarkCompare (results_old ['results'], results ['results']):
+            sys.stderr.write ('{:<36}{:>16.3f}{:>16.3f}{:>+9.1%}\n'.format (name, value_old, value_new, change))
+
+    return 0
+
+if __name__ == '__main__':
+    sys.exit (Main ())
+
+# vim: nu ft=python columns=120 :
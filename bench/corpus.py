@@ -0,0 +1,88 @@
+# -*- coding: utf-8 -*-
+import io
+import codecs
+import random
+import struct
+
+__all__ = ('CorpusWords', 'CorpusDSL', 'CorpusDICT',)
+#------------------------------------------------------------------------------#
+# Words                                                                        #
+#------------------------------------------------------------------------------#
+corpus_letters = u'abcdefghijklmnopqrstuvwxyz' * 4 + u'éèüöñç'
+
+def CorpusWords (count, seed = 0):
+    """Unique random words (reproducible for the same seed)
+    """
+    rand, words, found = random.Random (seed), [], set ()
+    while len (words) < count:
+        word = u''.join (rand.choice (corpus_letters) for _ in range (rand.randint (2, 10)))
+        if rand.random () < .1:
+            word = word.capitalize ()
+        if word not in found:
+            found.add (word)
+            words.append (word)
+    return words
+
+def corpus_phrase (rand, size):
+    return u' '.join (u''.join (rand.choice (corpus_letters) for _ in range (rand.randint (2, 9)))
+        for _ in range (size))
+
+#------------------------------------------------------------------------------#
+# DSL                                                                          #
+#------------------------------------------------------------------------------#
+def CorpusDSL (path, size, complexity = 2, seed = 0):
+    """Generate DSL (Lingvo) source with "size" cards
+
+    Complexity (1 to 3) controls number of meanings of each card and
+    variety of tags used in their bodies.
+    """
+    rand = random.Random (seed)
+    words = CorpusWords (size * 2, seed)
+    with io.open (path, 'wb') as stream:
+        stream.write (codecs.BOM_UTF16_LE)
+        lines = [u'#NAME "Synthetic DSL {}"'.format (size),
+                 u'#INDEX_LANGUAGE "English"',
+                 u'#CONTENTS_LANGUAGE "Russian"']
+
+        for index in range (size):
+            # headwords (some cards have alternative spellings)
+            lines.append (words [index])
+            if rand.random () < .2:
+                lines.append (words [size + index])
+
+            # meanings
+            for meaning in range (1, rand.randint (1, complexity) + 1):
+                lines.append (u'\t[m1]{}[p]{}[/p] [trn]{}, {}[/trn][/m]'.format (
+                    u'{}) '.format (meaning) if complexity > 1 else u'', rand.choice ((u'n.', u'v.', u'adj.')),
+                    corpus_phrase (rand, 2), corpus_phrase (rand, 1)))
+                if complexity > 1:
+                    lines.append (u'\t[m2][*][ex][lang id=1033]{}[/lang] — {}[/ex][/*][/m]'.format (
+                        corpus_phrase (rand, 3), corpus_phrase (rand, 2)))
+                if complexity > 2:
+                    lines.append (u'\t[m2][t]{}[/t] [com]{}[/com] [i]{}[/i] [c red]{}[/c] [ref]{}[/ref][/m]'.format (
+                        corpus_phrase (rand, 1), corpus_phrase (rand, 3), corpus_phrase (rand, 1),
+                        corpus_phrase (rand, 1), rand.choice (words)))
+
+            # flush
+            if len (lines) > 1024:
+                stream.write (u''.join (line + u'\r\n' for line in lines).encode ('utf-16le'))
+                del lines [:]
+        stream.write (u''.join (line + u'\r\n' for line in lines).encode ('utf-16le'))
+
+#------------------------------------------------------------------------------#
+# DICT                                                                         #
+#------------------------------------------------------------------------------#
+def CorpusDICT (path, size, seed = 0):
+    """Generate DICT source with "size" cards
+
+    Path is a prefix of generated data (.dict) and index (.idx) files.
+    """
+    rand = random.Random (seed)
+    desc_struct = struct.Struct ('>2I')
+    with io.open (path + '.dict', 'wb') as data, io.open (path + '.idx', 'wb') as index:
+        for word in sorted (CorpusWords (size, seed), key = lambda word: word.encode ('utf-8')):
+            body = u'{}\n  {}\n'.format (word, corpus_phrase (rand, rand.randint (1, 6))).encode ('utf-8')
+            index.write (word.encode ('utf-8') + b'\x00' + desc_struct.pack (data.tell (), len (body)))
+            data.write (body)
+
+# vim: nu ft=python columns=120 :
@@ -0,0 +1,214 @@
+# -*- coding: utf-8 -*-
+import os
+import random
+import shutil
+import multiprocessing
+from timeit import default_timer as timer
+
+from MaggotDict.dictionary import Dictionary
+from MaggotDict.metrics import Metrics
+from MaggotDict.sources import Source
+from MaggotDict.apps.app import DictApp, Completion
+from MaggotDict.pretzel.store import FileStore
+
+from .corpus import CorpusDSL, CorpusDICT
+
+__all__ = ('Benchmark', 'BenchmarkCompare',)
+#------------------------------------------------------------------------------#
+# Benchmark                                                                    #
+#------------------------------------------------------------------------------#
+def Benchmark (path, size, complexity = 2, seed = 0, block_size = None, report = None, memory = None):
+    """Run benchmark suite in "path" directory
+
+    Returns flat dictionary of named measurements, names end with unit.
+    Compile is run in separate process (with "memory" budget if provided),
+    so its peak memory is measured independently of the rest of the suite.
+    """
+    report = report or (lambda name, value: None)
+    results = {}
+    def result (name, value):
+        results [name] = round (value, 6)
+        report (name, value)
+
+    # corpus
+    dsl_path, dict_path = os.path.join (path, 'bench.dsl'), os.path.join (path, 'bench')
+    if not os.path.exists (dsl_path):
+        CorpusDSL (dsl_path, size, complexity, seed)
+        CorpusDICT (dict_path, size, seed)
+
+    for name, src in (('dsl', dsl_path), ('dict', dict_path + '.dict')):
+        dst = os.path.join (path, '{}.mdict'.format (name))
+
+        # parse
+        start = timer ()
+        with Source (src) as source:
+            cards = sum (1 for card in source.Cards ())
+        elapsed = timer () - start
+        result ('{}.parse.cards_per_s'.format (name), cards / elapsed)
+        result ('{}.parse.source_mb_per_s'.format (name), bench_size (src) / elapsed / (1 << 20))
+
+        # compile
+        elapsed, peak = bench_process (bench_compile, src, dst, block_size, memory)
+        result ('{}.compile.elapsed_s'.format (name), elapsed)
+        result ('{}.compile.cards_per_s'.format (name), cards / elapsed)
+        result ('{}.compile.source_mb_per_s'.format (name), bench_size (src) / elapsed / (1 << 20))
+        if peak is not None:
+            result ('{}.compile.peak_rss_mb'.format (name), peak / float (1 << 20))
+        result ('{}.file_mb'.format (name), os.path.getsize (dst) / float (1 << 20))
+
+        with Dictionary (dst) as dct:
+            words = [word.decode ('utf-8') for word, _ in dct.ByWord.index [b'':]]
+        rand = random.Random (seed)
+
+        # exact lookup (cold: cards are decoded on each lookup)
+        keys = [rand.choice (words) for _ in range (1000)]
+        for state, cache_size in (('cold', 0), ('warm', None)):
+            with Dictionary (dst, cache_size = cache_size) as dct:
+                if cache_size is None:
+                    keys = keys [:64]
+                    for key in keys:
+                        dct.ByWord [key]
+                start = timer ()
+                for key in keys:
+                    dct.ByWord [key]
+                result ('{}.lookup.{}_us'.format (name, state), (timer () - start) / len (keys) * 1e6)
+
+        # prefix completion (merged completion index of single dictionary)
+        with Dictionary (dst) as dct:
+            comp_store_path = os.path.join (path, 'comp.store')
+            with FileStore (comp_store_path, mode = 'n') as comp_store:
+                comp = Completion (comp_store)
+                comp.Add (dct)
+
+                for prefix_size in (1, 2, 3):
+                    prefixes = [word [:prefix_size].encode ('utf-8') for word in rand.sample (words, 100)]
+                    start = timer ()
+                    for prefix in prefixes:
+                        comp (prefix, 50)
+                    result ('{}.complete.merged_{}_us'.format (name, prefix_size),
+                        (timer () - start) / len (prefixes) * 1e6)
+            os.unlink (comp_store_path)
+
+        # range iteration
+        with Dictionary (dst) as dct:
+            start = timer ()
+            entries = sum (1 for entry in dct.ByWord [words [0]:words [-1]])
+            result ('{}.range.entries_per_s'.format (name), entries / (timer () - start))
+
+        # range slicing (cold: boundary words are resolved without cache)
+        bounds = [sorted (rand.sample (words, 2)) for _ in range (1000)]
+        with Dictionary (dst, cache_size = 0) as dct:
+            start = timer ()
+            for word_start, word_stop in bounds:
+                dct.ByWord [word_start:word_stop]
+            result ('{}.range.slice_us'.format (name), (timer () - start) / len (bounds) * 1e6)
+
+    # startup (application with installed copies of DSL dictionary followed by
+    # lookup in one of them, the first start caches metadata of dictionaries)
+    app_path = os.path.join (path, 'app')
+    if os.path.exists (app_path):
+        shutil.rmtree (app_path)
+    app_type = bench_app (app_path)
+    os.makedirs (app_type.dcts_path)
+    dct_paths = [os.path.join (app_type.dcts_path, 'bench{}.mdict'.format (index))
+        for index in range (bench_startup_dcts)]
+    for dct_path in dct_paths:
+        shutil.copyfile (os.path.join (path, 'dsl.mdict'), dct_path)
+    with Dictionary (dct_paths [0]) as dct:
+        word = next (iter (dct.ByWord.index [b'':])) [0].decode ('utf-8')
+
+    for state in ('first', 'warm'):
+        start = timer ()
+        with app_type () as app:
+            next (app.Dicts.Enabled ()).ByWord [word]
+        result ('startup.{}_ms'.format (state), (timer () - start) * 1e3)
+
+    # all dictionaries opened on startup (reference)
+    start = timer ()
+    dcts = [Dictionary (dct_path) for dct_path in dct_paths]
+    dcts [0].ByWord [word]
+    for dct in dcts:
+        dct.Dispose ()
+    result ('startup.open_all_ms', (timer () - start) * 1e3)
+    shutil.rmtree (app_path)
+
+    peak = Metrics.PeakMemory ()
+    if peak is not None:
+        result ('suite.peak_rss_mb', peak / float (1 << 20))
+
+    return results
+
+def BenchmarkCompare (old, new):
+    """Compare results of two runs
+
+    Returns list of (name, old value, new value, relative change) for
+    measurements present in both runs.
+    """
+    return [(name, old [name], new [name], (new [name] - old [name]) / old [name] if old [name] else 0.)
+        for name in sorted (set (old).intersection (new))]
+
+#------------------------------------------------------------------------------#
+# Helpers                                                                      #
+#------------------------------------------------------------------------------#
+def bench_compile (src, dst, block_size, memory):
+    """Compile dictionary, returns elapsed time
+    """
+    start = timer ()
+    Dictionary.Compile (src, dst, block_size = block_size, memory = memory).Dispose ()
+    return timer () - start
+
+bench_startup_dcts = 10
+
+def bench_app (path):
+    """Application type with state and dictionaries inside "path" directory
+    """
+    return type ('BenchApp', (DictApp,), {
+        'root_path'  : path,
+        'dcts_path'  : os.path.join (path, 'dicts'),
+        'state_path' : os.path.join (path, 'state.store'),
+        'daemon_path': os.path.join (path, 'daemon.sock'),
+    })
+
+def bench_process (func, *args):
+    """Execute function in separate process
+
+    Returns result of the function and peak memory of the process in bytes
+    (None if not available). Exception raised by the function is re-raised.
+    """
+    conn, conn_child = multiprocessing.Pipe (False)
+    process = multiprocessing.Process (target = bench_process_main, args = (conn_child, func, args))
+    process.start ()
+    conn_child.close () # otherwise recv does not fail if the child exits without sending
+    try:
+        error, value, memory = conn.recv ()
+    except EOFError:
+        process.join ()
+        raise RuntimeError ('benchmark process has exited with code {}'.format (process.exitcode))
+    finally:
+        conn.close ()
+    process.join ()
+
+    if error is not None:
+        raise error
+    return value, memory
+
+def bench_process_main (conn, func, args):
+    try:
+        conn.send ((None, func (*args), Metrics.PeakMemory ()))
+    except Exception as error:
+        try:
+            conn.send ((error, None, None))
+        except Exception: # error is not picklable
+            conn.send ((RuntimeError ('{}: {}'.format (type (error).__name__, error)), None, None))
+    finally:
+        conn.close ()
+
+def bench_size (src):
+    """Size of source files in bytes
+    """
+    size = os.path.getsize (src)
+    if src.endswith ('.dict'):
+        size += os.path.getsize (src [:-len ('.dict')] + '.idx')
+    return size
+
+# vim: nu ft=python columns=120 :